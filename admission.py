@@ -0,0 +1,175 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+# ---- Admission control for /api/analyze ----
+# At most max_in_flight pipelines run at once; the rest wait in a bounded
+# priority queue (interactive before batch). A full queue is rejected
+# immediately with a Retry-After estimate instead of slowing everyone down.
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+class QueueFull(Exception):
+    def __init__(self, priority: str, retry_after: int):
+        super().__init__(f"Analysis queue full for {priority} requests")
+        self.priority = priority
+        self.retry_after = retry_after
+
+class Ticket:
+    """One caller's place in line - promote() can move it up while it waits"""
+    __slots__ = ('priority', 'future')
+
+    def __init__(self, priority: str = "interactive"):
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        self.priority = priority
+        self.future = None  # set while queued
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int = 4, max_queue: int = 16, max_batch_queue: Optional[int] = None,
+                 initial_service_seconds: float = 30.0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        # Batch can only fill part of the queue - the rest stays free for interactive users
+        self.max_batch_queue = self.max_queue // 2 if max_batch_queue is None else min(max_batch_queue, self.max_queue)
+        self.avg_service_seconds = initial_service_seconds
+
+        self.in_flight = 0
+        self._waiters = []  # heap of (rank, seq, ticket) - entries whose rank went stale are skipped
+        self._seq = itertools.count()
+        self._queued = {p: 0 for p in PRIORITIES}
+
+        self.admitted = {p: 0 for p in PRIORITIES}
+        self.rejected = {p: 0 for p in PRIORITIES}
+        self.completed = 0
+        self.max_queue_depth_seen = 0
+        self._waits = {p: deque(maxlen=1000) for p in PRIORITIES}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(self._queued.values())
+
+    def _queue_limit(self, priority: str) -> int:
+        return self.max_batch_queue if priority == "batch" else self.max_queue
+
+    def _depth_ahead(self, priority: str) -> int:
+        """Waiters that would be served before a new request of this priority"""
+        rank = PRIORITIES[priority]
+        return sum(count for p, count in self._queued.items() if PRIORITIES[p] <= rank)
+
+    def retry_after(self, priority: str) -> int:
+        """Seconds until a slot is likely free for this priority, from the service-time EWMA"""
+        waves = (self._depth_ahead(priority) + 1) / self.max_in_flight
+        return max(1, math.ceil(waves * self.avg_service_seconds))
+
+    async def acquire(self, priority: str = "interactive", ticket: Optional[Ticket] = None) -> float:
+        """Wait for a pipeline slot - returns seconds spent queued, raises QueueFull
+
+        Pass a ticket to allow promote() while waiting; its priority wins over `priority`.
+        """
+        ticket = ticket or Ticket(priority)
+        priority = ticket.priority
+
+        if self.in_flight < self.max_in_flight and self.queue_depth == 0:
+            self.in_flight += 1
+            self._record_admit(priority, 0.0)
+            return 0.0
+
+        if self.queue_depth >= self.max_queue or self._queued[priority] >= self._queue_limit(priority):
+            self.rejected[priority] += 1
+            raise QueueFull(priority, self.retry_after(priority))
+
+        future = asyncio.get_running_loop().create_future()
+        ticket.future = future
+        heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._seq), ticket))
+        self._queued[priority] += 1
+        self.max_queue_depth_seen = max(self.max_queue_depth_seen, self.queue_depth)
+        enqueued_at = time.monotonic()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed to us just as the client went away - pass it on
+                self.release()
+            else:
+                future.cancel()
+                self._queued[ticket.priority] -= 1
+            raise
+        finally:
+            ticket.future = None
+
+        waited = time.monotonic() - enqueued_at
+        self._record_admit(ticket.priority, waited)
+        return waited
+
+    def promote(self, ticket: Ticket, priority: str):
+        """Raise a ticket's priority - takes effect in the queue if it's already waiting"""
+        if PRIORITIES[priority] >= PRIORITIES[ticket.priority]:
+            return
+        old, ticket.priority = ticket.priority, priority
+        if ticket.future is not None and not ticket.future.done():
+            self._queued[old] -= 1
+            self._queued[priority] += 1
+            heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._seq), ticket))
+
+    def release(self, service_seconds: Optional[float] = None):
+        """Free a slot and hand it to the best waiter (interactive first, FIFO within a class)"""
+        if service_seconds is not None:
+            self.completed += 1
+            self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * service_seconds
+
+        self.in_flight -= 1
+        while self._waiters:
+            rank, _, ticket = heapq.heappop(self._waiters)
+            future = ticket.future
+            if future is None or future.done():
+                continue  # cancelled while queued - already uncounted
+            if rank != PRIORITIES[ticket.priority]:
+                continue  # promoted - the newer entry serves it
+            self._queued[ticket.priority] -= 1
+            self.in_flight += 1
+            future.set_result(None)
+            return
+
+    def _record_admit(self, priority: str, waited: float):
+        self.admitted[priority] += 1
+        self._waits[priority].append(waited)
+
+    @asynccontextmanager
+    async def admit(self, priority: str = "interactive", ticket: Optional[Ticket] = None):
+        """async with admission.admit(priority) as queued_seconds: ..."""
+        waited = await self.acquire(priority, ticket)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(time.monotonic() - started)
+
+    def metrics(self) -> Dict:
+        def wait_stats(samples) -> Dict:
+            ordered = sorted(samples)
+            if not ordered:
+                return {"p50": None, "p95": None, "max": None}
+            pick = lambda pct: ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+            return {"p50": round(pick(50), 3), "p95": round(pick(95), 3), "max": round(ordered[-1], 3)}
+
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queue_depth,
+            "queue_depth_by_priority": dict(self._queued),
+            "max_queue": self.max_queue,
+            "max_batch_queue": self.max_batch_queue,
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "admitted": dict(self.admitted),
+            "rejected": dict(self.rejected),
+            "completed": self.completed,
+            "avg_service_seconds": round(self.avg_service_seconds, 2),
+            "wait_seconds": {p: wait_stats(s) for p, s in self._waits.items()}
+        }
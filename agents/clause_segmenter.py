@@ -0,0 +1,112 @@
+import re
+from typing import List, Tuple
+from agents.records import Clause
+
+# SINGLE-PASS CLAUSE SEGMENTER (ingestion fallback)
+# One precompiled alternation walks the text once and yields section breaks,
+# violation hits and keyword windows together - linear in document size.
+
+SECTION_PATTERN = r'SECTION \d+|PART \d+|CHAPTER \d+|\b\d+\.\d+\b'
+
+VIOLATION_PATTERNS = [
+    r'\d+ (?:months?|days?|years?|crores?|lakhs?)',
+    r'self[-\s]?declaration', r'written confirmation', r'not mandatory',
+    r'next business day', r'tier[-—]?\d+', r'pre[-]?approved',
+    r'no re[-]?verification', r'trustee', r'simplified'
+]
+
+# Real regexes - 'months?' must match "month" and "months", not the literal "months?"
+KEYWORD_PATTERNS = [
+    'calendar days', 'months?', 'years?', 'not mandatory', 'self-declaration',
+    'written confirmation', 'next business day', 'tier-', 'pre-approved'
+]
+
+MAX_SECTION_CHARS = 1200
+MIN_SECTION_CHARS = 30
+KEYWORD_WINDOW_BEFORE = 150
+KEYWORD_WINDOW_AFTER = 250
+
+def _group(prefix: str, index: int, pattern: str) -> str:
+    return f"(?P<{prefix}{index}>{pattern})"
+
+# Every alternative starts a word with one of these characters - lets the
+# engine reject most positions before trying the alternation
+FIRST_CHARS = r'\b(?=[scpwntmy\d])'
+
+# Order matters: headers win over violations, violations over keywords
+MASTER_REGEX = re.compile(
+    FIRST_CHARS + '(?:' + '|'.join(
+        [f"(?P<section>{SECTION_PATTERN})"]
+        + [_group('v', i, p) for i, p in enumerate(VIOLATION_PATTERNS)]
+        + [_group('k', i, p) for i, p in enumerate(KEYWORD_PATTERNS)]
+    ) + ')',
+    re.IGNORECASE
+)
+
+# Group number → ('section' | 'v' | 'k', pattern index) - avoids name parsing per match
+GROUP_KINDS = {
+    number: (name, 0) if name == 'section' else (name[0], int(name[1:]))
+    for name, number in MASTER_REGEX.groupindex.items()
+}
+
+# Keywords nested inside a longer violation match ("36 months" → 'months?')
+KEYWORD_REGEX = re.compile(
+    '|'.join(_group('k', i, p) for i, p in enumerate(KEYWORD_PATTERNS)),
+    re.IGNORECASE
+)
+
+def segment_policy(policy_text: str) -> Tuple[List[Clause], List[Clause]]:
+    """One pass → (section clauses, keyword-window clauses), both with source offsets"""
+    sections = []
+    keyword_clauses = []
+    text_len = len(policy_text)
+
+    section_start = 0
+    section_hits = {}  # violation index → first hit in the current section
+
+    def close_section(end: int):
+        raw = policy_text[section_start:end]
+        stripped = raw.strip()
+        if len(stripped) > MIN_SECTION_CHARS:
+            start = section_start + (len(raw) - len(raw.lstrip()))
+            clause_id = len(sections) + 1
+            text = stripped[:MAX_SECTION_CHARS]
+            sections.append(Clause(
+                id=f"clause_{clause_id}",
+                text=text,
+                section=f"SEC-{clause_id}",
+                violations_detected=[section_hits[i] for i in sorted(section_hits)],
+                span=(start, start + len(text))  # policy_text[span] == text, even truncated
+            ))
+
+    def add_keyword(index: int, start: int, end: int):
+        pattern = KEYWORD_PATTERNS[index]
+        window_start = max(0, start - KEYWORD_WINDOW_BEFORE)
+        window_end = min(text_len, end + KEYWORD_WINDOW_AFTER)
+        keyword_clauses.append(Clause(
+            id=f"kw_clause_{len(keyword_clauses)+1}",
+            text=policy_text[window_start:window_end],
+            section=f"KEYWORD-{pattern.upper()}",
+            violations_detected=[pattern],
+            span=(window_start, window_end)
+        ))
+
+    for match in MASTER_REGEX.finditer(policy_text):
+        kind, index = GROUP_KINDS[match.lastindex]
+
+        if kind == 'section':
+            close_section(match.start())
+            section_start = match.end()
+            section_hits = {}
+            continue
+
+        if kind == 'k':
+            add_keyword(index, match.start(), match.end())
+            continue
+
+        section_hits.setdefault(index, match.group())
+        for inner in KEYWORD_REGEX.finditer(policy_text, match.start(), match.end()):
+            add_keyword(int(inner.lastgroup[1:]), inner.start(), inner.end())
+
+    close_section(text_len)
+    return sections, keyword_clauses
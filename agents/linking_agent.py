@@ -1,23 +1,80 @@
-from typing import List, Dict
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from agents import MODELNAME
+from agents.records import Clause, Rule, Link, RecordTable
+from agents.retrieval import semantic_links
 import json
+import os
 
-def link_policy_to_rbi(clauses: List[Dict], rbi_rules: List[Dict]) -> List[Dict]:
+# AI LINKING - every clause, in chunks that run concurrently
+AI_LINK_CHUNK_SIZE = 15
+AI_LINK_MAX_WORKERS = 4
+
+# SEMANTIC LINKING - embedding retrieval replaces the generative round trip
+SEMANTIC_LINKING = os.getenv("CLARITY_SEMANTIC_LINKING", "1") != "0"
+SEMANTIC_TOP_K = 3
+
+# Keyword links only score 0.05-0.15 against the first 5 rules - a clause with nothing
+# stronger has no real rule match yet
+KEYWORD_MAX_SIMILARITY = 0.15
+
+def link_policy_to_rbi(clauses: List[Clause], rbi_rules: List[Rule]) -> List[Link]:
     """DYNAMIC linking based on input size"""
     print("🔗 Dynamic linking...")
     
     links = keyword_fallback(clauses, rbi_rules)
     
-    # Scale AI usage by clause count
-    if len(links) < len(clauses) * 1.5:  # Need more links?
+    # One batched embedding call + a matrix product
+    semantic_ok = False
+    if SEMANTIC_LINKING:
         try:
-            clauses_text = '\n'.join([f"{c['id']}: {c['text'][:200]}" for c in clauses[:15]])  # Limit context
-            rbi_text = '\n'.join([f"{r['id']}: {r['text'][:200]}" for r in rbi_rules])
-            
-            model = genai.GenerativeModel(MODELNAME)
-            target_links = min(len(clauses) * 2, 40)
-            prompt = f"""POLICY CLAUSES: {clauses_text}
+            links = merge_links(links, semantic_links(clauses, rbi_rules, top_k=SEMANTIC_TOP_K))
+            semantic_ok = True
+        except Exception as e:
+            print(f"Semantic linking failed: {e}")
+    
+    # Generative linking only when retrieval is unavailable - for every clause keyword
+    # matching couldn't really place
+    if not semantic_ok:
+        uncovered = weakly_linked_clauses(clauses, links)
+        if uncovered:
+            print(f"🔗 {len(uncovered)}/{len(clauses)} clauses only have keyword-guess links")
+            links = merge_links(links, ai_link_chunked(RecordTable(uncovered), RecordTable(rbi_rules)))
+    
+    print(f"🔗 Created {len(links)} policy-RBI pairs")
+    return links  # No hard limit
+
+def weakly_linked_clauses(clauses: List[Clause], links: List[Link]) -> List[Clause]:
+    """Clauses with no link above keyword-match strength"""
+    best = {}
+    for link in links:
+        best[link.policyid] = max(best.get(link.policyid, 0.0), float(link.similarity or 0))
+    return [c for c in clauses if best.get(c.id, 0.0) <= KEYWORD_MAX_SIMILARITY]
+
+def ai_link_chunked(clause_index: RecordTable, rule_index: RecordTable) -> List[Link]:
+    """Split ALL clauses into chunks, link them concurrently - latency ≈ slowest chunk"""
+    clauses = list(clause_index)
+    chunks = [clauses[i:i + AI_LINK_CHUNK_SIZE] for i in range(0, len(clauses), AI_LINK_CHUNK_SIZE)]
+    if not chunks or not len(rule_index):
+        return []
+    
+    rbi_text = '\n'.join([f"{r.id}: {r.text[:200]}" for r in rule_index])
+    with ThreadPoolExecutor(max_workers=min(AI_LINK_MAX_WORKERS, len(chunks))) as pool:
+        results = pool.map(lambda chunk: _ai_link_chunk(chunk, rbi_text, clause_index, rule_index), chunks)
+        ai_links = [link for chunk_links in results for link in chunk_links]
+    
+    print(f"🤖 AI linked {len(chunks)} chunks → {len(ai_links)} pairs")
+    return ai_links
+
+def _ai_link_chunk(chunk: List[Clause], rbi_text: str, clause_index: RecordTable, rule_index: RecordTable) -> List[Link]:
+    """One Gemini call for one chunk - unknown ids are dropped, never guessed"""
+    try:
+        clauses_text = '\n'.join([f"{c.id}: {c.text[:200]}" for c in chunk])  # Limit context
+        
+        model = genai.GenerativeModel(MODELNAME)
+        target_links = min(len(chunk) * 2, 40)
+        prompt = f"""POLICY CLAUSES: {clauses_text}
 RBI RULES: {rbi_text}
 
 Create {target_links} JSON links between clauses and rules.
@@ -27,27 +84,51 @@ Return ONLY valid JSON array:
   ...
 ]
 """
-            
-            resp = model.generate_content(prompt)
-            ai_links_data = json.loads(resp.text.strip())
-            
-            for link_data in ai_links_data:
-                policy_clause = next((c for c in clauses if c['id'] == link_data['policyid']), clauses[0])
-                rbi_rule = next((r for r in rbi_rules if r['id'] == link_data['rbiid']), rbi_rules[0])
-                links.append({
-                    'policyid': link_data['policyid'],
-                    'policytext': policy_clause['text'],
-                    'rbiid': link_data['rbiid'],
-                    'rbitext': rbi_rule['text'],
-                    'similarity': link_data['similarity']
-                })
-        except Exception as e:
-            print(f"AI linking failed: {e}")
+        
+        resp = model.generate_content(prompt)
+        response_text = resp.text.strip()
+        if '```json' in response_text:
+            response_text = response_text.split('```json')[1].split('```')[0]
+        elif '```' in response_text:
+            response_text = response_text.split('```')[1].split('```')[0]
+        ai_links_data = json.loads(response_text)
+    except Exception as e:
+        print(f"AI linking failed: {e}")
+        return []
     
-    print(f"🔗 Created {len(links)} policy-RBI pairs")
-    return links  # No hard limit
+    links = []
+    dropped = 0
+    for link_data in ai_links_data:
+        try:
+            policyid = str(link_data['policyid'])
+            rbiid = str(link_data['rbiid'])
+            similarity = float(link_data.get('similarity', 0))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            dropped += 1
+            continue
+        if policyid not in clause_index or rbiid not in rule_index:
+            dropped += 1
+            continue
+        links.append(Link(policyid, rbiid, similarity))
+    
+    if dropped:
+        print(f"⚠️ Dropped {dropped} AI links with unknown or malformed ids")
+    return links
+
+def merge_links(*link_lists: List[Link]) -> List[Link]:
+    """Dedupe on (policyid, rbiid) - keep first position, highest similarity"""
+    merged = {}
+    for links in link_lists:
+        for link in links:
+            key = (link.policyid, link.rbiid)
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = link
+            elif link.similarity > existing.similarity:
+                merged[key] = Link(link.policyid, link.rbiid, link.similarity)
+    return list(merged.values())
 
-def keyword_fallback(clauses: List[Dict], rbi_rules: List[Dict]) -> List[Dict]:
+def keyword_fallback(clauses: List[Clause], rbi_rules: List[Rule]) -> List[Link]:
     """Unified keyword matching"""
     policy_keywords = [
         'kyc', 'str', 'pep', 'monitoring', 'documents', 'cash', 'beneficial', 
@@ -58,25 +139,19 @@ def keyword_fallback(clauses: List[Dict], rbi_rules: List[Dict]) -> List[Dict]:
     
     links = []
     for clause in clauses:
-        clause_lower = clause['text'].lower()
+        clause_lower = clause.text.lower()
         best_matches = []
         
         for rbi in rbi_rules[:5]:
-            rbi_lower = rbi['text'].lower()
+            rbi_lower = rbi.text.lower()
             matches = sum(1 for kw in policy_keywords if kw in clause_lower or kw in rbi_lower)
-            similarity = 0.15 if matches >= 2 else (0.10 if matches == 1 else 0.05)
+            similarity = KEYWORD_MAX_SIMILARITY if matches >= 2 else (0.10 if matches == 1 else 0.05)
             
             if similarity > 0:
                 best_matches.append((rbi, similarity))
         
         best_matches.sort(key=lambda x: x[1], reverse=True)
         for rbi, sim in best_matches[:3]:
-            links.append({
-                'policyid': clause['id'],
-                'policytext': clause['text'],
-                'rbiid': rbi['id'],
-                'rbitext': rbi['text'],
-                'similarity': sim
-            })
+            links.append(Link(clause.id, rbi.id, sim))
     
     return links
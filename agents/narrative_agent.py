@@ -1,6 +1,6 @@
-from typing import Dict
 import google.generativeai as genai
 from agents import MODELNAME
+from agents.records import Clause, Rule, Conflict
 
 NARRATIVE_SYSTEM_PROMPT = """
 You write clear compliance reports for bank executives and RBI auditors.
@@ -15,17 +15,16 @@ Structure:
 Keep it concise (3-4 sentences), professional tone.
 """
 
-def build_narrative(conflict: Dict) -> Dict:
-    """AI-powered audit-ready narrative - FIXED KEYS"""
+def build_narrative(conflict: Conflict, clause: Clause, rule: Rule) -> Conflict:
+    """AI-powered audit-ready narrative - texts come from the clause/rule tables"""
     model = genai.GenerativeModel(MODELNAME, system_instruction=NARRATIVE_SYSTEM_PROMPT)
     
-    # FIXED: Use correct keys from conflict_agent.py
-    rbitext = conflict.get('rbitext', '')
-    policytext = conflict.get('policytext', '')
-    risk_score = conflict.get('risk_score', 0)
-    components = conflict.get('components', {})
-    status = conflict.get('status', '')
-    rulematched = conflict.get('rulematched', '')
+    rbitext = rule.text
+    policytext = clause.text
+    risk_score = conflict.risk_score or 0
+    components = conflict.components or {}
+    status = conflict.status
+    rulematched = conflict.rulematched or ''
     
     prompt = f"""
 RBI Requirement: {rbitext}
@@ -40,11 +39,11 @@ Write audit-ready narrative following exact structure.
     
     try:
         resp = model.generate_content(prompt)
-        conflict["narrative"] = resp.text.strip()  # Cap for frontend
-        print(f"   📝 Narrative generated ({len(conflict['narrative'])} chars)")
+        conflict.narrative = resp.text.strip()  # Cap for frontend
+        print(f"   📝 Narrative generated ({len(conflict.narrative)} chars)")
     except Exception as e:
         print(f"   ⚠️ Narrative failed: {e}")
-        conflict["narrative"] = f"""
+        conflict.narrative = f"""
 VIOLATION SUMMARY ({status})
 
 RBI: {rbitext}
@@ -57,15 +56,13 @@ Action Required: Immediate policy alignment needed.
     return conflict
 
 if __name__ == "__main__":
-    test_conflict = {
-        'status': 'CONTRADICTSREG',
-        'rbitext': 'STRs must be filed within 7 calendar days to FIU-IND',
-        'policytext': 'STRs prepared within 7 days but filed within 10 calendar days after manager approval',
-        'rulematched': '10 calendar days',
-        'risk_score': 9.3,
-        'components': {'regulatory_strictness': 3.2, 'policy_gap': 3.5, 'audit_exposure': 2.6}
-    }
+    from agents.records import Link
+    test_clause = Clause('clause_1', 'STRs prepared within 7 days but filed within 10 calendar days after manager approval')
+    test_rule = Rule('str_7days_2025', 'STRs must be filed within 7 calendar days to FIU-IND')
+    test_conflict = Conflict(Link(test_clause.id, test_rule.id), 'CONTRADICTSREG', rulematched='10 calendar days')
+    test_conflict.risk_score = 9.3
+    test_conflict.components = {'regulatory_strictness': 3.2, 'policy_gap': 3.5, 'audit_exposure': 2.6}
     
-    result = build_narrative(test_conflict)
+    result = build_narrative(test_conflict, test_clause, test_rule)
     print("✅ Test Narrative:")
-    print(result["narrative"])
+    print(result.narrative)
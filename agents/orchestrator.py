@@ -1,13 +1,19 @@
+import hashlib
 import json
-from typing import Dict
+from typing import Dict, List, Optional
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as DeadlineExceeded
 
 from agents.ingestion_agent import build_policy_clauses
 from agents.rbi_search_agent import extract_rbi_rules_from_web
 from agents.linking_agent import link_policy_to_rbi
-from agents.conflict_agent import detect_conflict
+from agents.conflict_agent import detect_conflict, match_violation_rule, RULE_SEVERITY
 from agents.risk_shap_agent import score_risk
 from agents.narrative_agent import build_narrative
+from agents.records import Rule, Link, RecordTable
+from agents.rbi_corpus import CORPUS_VERSION
+from agents.singleflight import SingleFlight
+from agents import MODELNAME
 
 # FIXED SYMBOLS
 CONFLICT_SYMBOLS = {
@@ -17,69 +23,210 @@ CONFLICT_SYMBOLS = {
     'FULLYALIGNS': '✓ FULLY ALIGNS'
 }
 
-def run_clarity(policy_text: str) -> Dict:
+MAX_RBI_RULES = 12  # most relevant rules per policy, picked by topic overlap
+
+def prioritize_links(links: List[Link], clause_table: RecordTable, max_conflicts: Optional[int] = None) -> List[Link]:
+    """Order pairs by expected value: rule-hit severity + similarity (ties keep linking order)
+
+    The rule path only reads the clause, so a rule-hit clause gets ONE pair (its best link);
+    its other pairs would repeat that verdict and sink below every other clause's pairs.
+    Rule hits past max_conflicts could never be reported, so those rank below other clauses too.
+    """
+    hits = {}
+    for policyid in {link.policyid for link in links}:
+        hit = match_violation_rule(clause_table[policyid].text)
+        hits[policyid] = RULE_SEVERITY.get(hit[1], 0.0) if hit else None
+
+    by_similarity = sorted(range(len(links)), key=lambda i: float(links[i].similarity or 0), reverse=True)
+    values = {}
+    representatives = {}  # rule-hit clause → index of its best link
+    for i in by_similarity:
+        policyid = links[i].policyid
+        similarity = float(links[i].similarity or 0)
+        if hits[policyid] is None:
+            values[i] = similarity
+        elif policyid not in representatives:
+            representatives[policyid] = i
+            values[i] = hits[policyid] + similarity
+        else:
+            values[i] = similarity - 2.0  # repeat verdict - only if budget is left over
+
+    if max_conflicts is not None:
+        ranked = sorted(representatives.values(), key=lambda i: (-values[i], i))
+        for i in ranked[max_conflicts:]:
+            values[i] = float(links[i].similarity or 0) - 1.0  # over the conflict cap
+
+    return [links[i] for i in sorted(range(len(links)), key=lambda i: (-values[i], i))]
+
+def _call_within_deadline(executor: Optional[ThreadPoolExecutor], deadline: Optional[float], fn, *args):
+    """Run fn inside the remaining budget - raises DeadlineExceeded once the budget is spent"""
+    if deadline is None:
+        return fn(*args)
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise DeadlineExceeded("deadline reached")
+    return executor.submit(fn, *args).result(timeout=remaining)
+
+# Concurrent uploads of the same document share one pipeline run
+_analysis_flight = SingleFlight()
+
+def analysis_key(policy_text: str, deadline_seconds: Optional[float] = None) -> str:
+    """Coalescing key - extracted text + corpus version + model (+ deadline, which shapes the result)"""
+    digest = hashlib.sha256(policy_text.encode('utf-8', 'ignore')).hexdigest()
+    return f"{digest}:{CORPUS_VERSION}:{MODELNAME}:{deadline_seconds or ''}"
+
+def run_clarity(policy_text: str, deadline_seconds: Optional[float] = None, queued_seconds: float = 0.0) -> Dict:
+    """Full pipeline - with deadline_seconds, returns a partial result when the budget runs out
+
+    Identical concurrent requests are coalesced: the first one runs, the rest wait on its
+    result. The returned dict may be shared between callers - treat it as read-only.
+    queued_seconds (time already spent waiting for admission) comes out of the budget but
+    not out of the coalescing key, so requests that queued still join each other.
+    """
+    result, shared = _analysis_flight.do(
+        analysis_key(policy_text, deadline_seconds), _run_clarity, policy_text, deadline_seconds, queued_seconds
+    )
+    if shared:
+        print("🔁 Coalesced with an identical in-flight analysis")
+    return result
+
+def _run_clarity(policy_text: str, deadline_seconds: Optional[float], queued_seconds: float = 0.0) -> Dict:
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clarity") if deadline_seconds else None
+    try:
+        return _run_pipeline(policy_text, deadline_seconds, executor, queued_seconds)
+    finally:
+        if executor:
+            # Don't block on an LLM call that already overran the budget
+            executor.shutdown(wait=False)
+
+def _run_pipeline(policy_text: str, deadline_seconds: Optional[float], executor: Optional[ThreadPoolExecutor],
+                  queued_seconds: float = 0.0) -> Dict:
     print("🚀 Processing policy text...")
     start_time = time.time()
-
-    clauses = build_policy_clauses(policy_text)
+    deadline = start_time + max(deadline_seconds - queued_seconds, 0.1) if deadline_seconds else None
+
+    try:
+        clauses = _call_within_deadline(executor, deadline, build_policy_clauses, policy_text)
+    except DeadlineExceeded:
+        print("⏱️ Deadline hit during clause extraction")
+        clauses = []
+    clause_table = RecordTable(clauses)
+    clauses = list(clause_table)  # downstream works off the table - one record per id
     clause_count = len(clauses)
     print(f"📄 {clause_count} policy clauses extracted")
 
     max_pairs = min(clause_count * 2, 40)
     max_conflicts = min(int(clause_count * 1.2), 30)
 
-    rbi_rules = extract_rbi_rules_from_web(policy_text)[:12]
+    rbi_rules = []
+    if clauses:
+        try:
+            rbi_rules = _call_within_deadline(executor, deadline, extract_rbi_rules_from_web, policy_text, MAX_RBI_RULES)
+        except DeadlineExceeded:
+            print("⏱️ Deadline hit during RBI rule loading")
+    rule_table = RecordTable(Rule.from_dict(r) for r in rbi_rules)
+    rbi_rules = list(rule_table)
 
     print(f"⚡ Dynamic: {max_pairs} pairs | {max_conflicts} conflicts | {len(rbi_rules)} RBI rules")
 
-    links = link_policy_to_rbi(clauses, rbi_rules)[:max_pairs]
+    links = []
+    if rbi_rules:
+        try:
+            links = _call_within_deadline(executor, deadline, link_policy_to_rbi, clauses, rbi_rules)
+        except DeadlineExceeded:
+            print("⏱️ Deadline hit during linking")
+    links = prioritize_links(links, clause_table, max_conflicts)[:max_pairs]
 
     print("🔍 Detecting conflicts...")
     conflicts = []
     seen_policy_rules = set()
+    duplicate_count = 0
+    over_cap_count = 0
+    safe_count = 0
+    not_evaluated = []
+    deadline_hit = False
 
     for i, link in enumerate(links):
-        print(f"🔍 Checking pair {i+1}/{len(links)}...")
-        conflict = detect_conflict(link)
+        if deadline_hit:
+            not_evaluated.append(link)
+            continue
 
-        status = conflict.get("status", "UNKNOWN")
+        print(f"🔍 Checking pair {i+1}/{len(links)}...")
+        clause = clause_table[link.policyid]
+        rule = rule_table[link.rbiid]
+        try:
+            conflict = _call_within_deadline(executor, deadline, detect_conflict, link, clause, rule)
+        except DeadlineExceeded:
+            print(f"⏱️ Deadline hit - {len(links) - i} pairs not evaluated")
+            deadline_hit = True
+            not_evaluated.append(link)
+            continue
+
+        status = conflict.status or "UNKNOWN"
         print(f"  {CONFLICT_SYMBOLS.get(status, '❓ UNKNOWN')}")
 
-        rule_id = (conflict.get("policyid"), conflict.get("rulematched"))
+        rule_id = (conflict.policyid, conflict.rulematched)
 
-        if (
-            status in ["RELAXESREG", "CONTRADICTSREG"]
-            and rule_id not in seen_policy_rules
-            and len(conflicts) < max_conflicts
-        ):
+        if status not in ["RELAXESREG", "CONTRADICTSREG"]:
+            safe_count += 1
+        elif rule_id in seen_policy_rules:
+            duplicate_count += 1  # same verdict already reported - not safe either
+        elif len(conflicts) >= max_conflicts:
+            over_cap_count += 1  # distinct violation dropped by max_conflicts
+        else:
             seen_policy_rules.add(rule_id)
-            score_risk(conflict)
-            build_narrative(conflict)
+            try:
+                # Enrich a copy so an overrunning call can't mutate what we return
+                conflict = _call_within_deadline(executor, deadline, score_risk, conflict.copy(), clause, rule)
+                conflict = _call_within_deadline(executor, deadline, build_narrative, conflict.copy(), clause, rule)
+            except DeadlineExceeded:
+                print("⏱️ Deadline hit during risk/narrative - conflict kept without enrichment")
+                deadline_hit = True
+                conflict.enrichment = "SKIPPED-DEADLINE"
             conflicts.append(conflict)
 
     duration = round(time.time() - start_time, 1)
+    pairs_checked = len(links) - len(not_evaluated)
+    partial = deadline is not None and (deadline_hit or time.time() >= deadline)
+
+    critical_count = sum(1 for c in conflicts if c.status == "CONTRADICTSREG")
+    warning_count = sum(1 for c in conflicts if c.status == "RELAXESREG")
 
-    critical_count = sum(1 for c in conflicts if c["status"] == "CONTRADICTSREG")
-    warning_count = sum(1 for c in conflicts if c["status"] == "RELAXESREG")
+    # Texts appear once, in the clause/rule tables - conflicts & skipped pairs carry ids
+    referenced = conflicts + not_evaluated
 
     output = {
         "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
         "processing_time_seconds": duration,
+        "deadline_seconds": deadline_seconds,
+        "partial": partial,
         "policy_clauses_count": clause_count,
         "rbi_rules_matched": len(rbi_rules),
-        "pairs_checked": len(links),
-        "conflicts": conflicts,
+        "pairs_scheduled": len(links),
+        "pairs_checked": pairs_checked,
+        "pairs_not_evaluated": [_skipped_pair(link) for link in not_evaluated],
+        "conflicts": [c.to_dict() for c in conflicts],
+        "clauses": clause_table.to_dict(item.policyid for item in referenced),
+        "rules": rule_table.to_dict(item.rbiid for item in referenced),
         "summary": {
             "critical": critical_count,
             "warnings": warning_count,
-            "safe": len(links) - len(conflicts),
-            "total_checked": len(links)
+            "safe": safe_count,
+            "duplicates": duplicate_count,
+            "over_cap": over_cap_count,
+            "total_checked": pairs_checked,
+            "not_evaluated": len(not_evaluated)
         }
     }
 
     print(
         f"\n🎯 Summary: {critical_count} 🚨 + {warning_count} ⚠️ "
         f"= {len(conflicts)} conflicts in {duration}s"
+        + (f" (PARTIAL - {len(not_evaluated)} pairs skipped)" if partial else "")
     )
 
     return output
+
+def _skipped_pair(link: Link) -> Dict:
+    """Marker for a pair the deadline cut off"""
+    return {**link.to_dict(), "reason": "DEADLINE"}
@@ -2,6 +2,9 @@ import requests
 from bs4 import BeautifulSoup
 from typing import List, Dict
 
+# Bump whenever get_all_rbi_sections() changes - part of analysis cache/coalescing keys
+CORPUS_VERSION = "2025.1"
+
 def fetch_latest_rbi_circulars(topics: List[str] = None) -> List[Dict]:
     """YOUR ORIGINAL SCRAPING LOGIC - 100% PRESERVED"""
     url = "https://www.rbi.org.in/Scripts/BS_ViewMasCirculardetails.aspx"
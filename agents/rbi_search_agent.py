@@ -1,18 +1,112 @@
 # agents/rbi_search_agent.py - COMPLETE REPLACEMENT
+import math
+import os
+import re
+import threading
 import requests
 from bs4 import BeautifulSoup
 import google.generativeai as genai
 import json
-from typing import List, Dict
-from .rbi_corpus import get_all_rbi_sections
+from collections import Counter
+from typing import List, Dict, Tuple, Union
+from agents import MODELNAME
+from .rbi_corpus import get_all_rbi_sections, CORPUS_VERSION
 
-def search_rbi_online(keywords: List[str]) -> List[Dict]:
-    """Try real RBI scraping first, fallback to corpus"""
-    return get_all_rbi_sections()  # Uses updated scraper
+# LLM keyword extraction costs a full-document round trip - opt in only
+LLM_KEYWORDS = os.getenv("CLARITY_LLM_KEYWORDS", "0") == "1"
+MIN_RELEVANT_RULES = 5  # top up with corpus order below this so linking always has candidates
+
+# ---------------- LOCAL TOPIC EXTRACTION ----------------
+# topic → term patterns. Policies and rules are both tagged with the same
+# single-pass regex, so a policy's topics index straight into the rules.
+
+TOPIC_TERMS = {
+    'kyc': [r'kyc', r'know your customer', r'customer identification', r'official(?:ly valid)? documents?',
+            r'ovd', r'aadhaar', r'account opening', r'onboarding', r'identity'],
+    'documents': [r'self[- ]declarations?', r'documentary', r'documents?', r'verbal', r'written confirmation'],
+    'cdd': [r'due diligence', r'cdd', r'edd', r'simplified', r'low[- ]risk', r'high[- ]risk', r'risk[- ]based'],
+    'str': [r'strs?', r'suspicious', r'fiu(?:-ind)?', r'tipping[- ]off'],
+    'pep': [r'peps?', r'politically exposed'],
+    'sanctions': [r'sanctions?', r'ofac', r'unsc', r'ofsi', r'screening', r'watch ?lists?'],
+    'beneficial_ownership': [r'beneficial own(?:er|ers|ership)', r'bo', r'beneficiar(?:y|ies)'],
+    'records': [r'records?', r'retention', r'retain(?:ed)?', r'record[- ]keeping'],
+    'wire_transfers': [r'swift', r'wire transfers?', r'cross[- ]border', r'remittances?', r'correspondent'],
+    'monitoring': [r'monitoring', r'monitored', r'real[- ]time', r'next[- ]business[- ]day', r'alerts?'],
+    'refresh': [r'refresh', r're-?kyc', r'periodic(?:al)? updat(?:e|ion)', r're-?verification'],
+    'high_value': [r'crores?', r'lakhs?', r'high[- ]value', r'thresholds?', r'cash', r'amount'],
+}
+
+TOPIC_REGEX = re.compile(
+    '|'.join(rf"\b(?P<{topic}>{'|'.join(terms)})\b" for topic, terms in TOPIC_TERMS.items()),
+    re.IGNORECASE
+)
+
+def extract_topics_local(text: str) -> Dict[str, int]:
+    """topic → hit count in one regex pass - no LLM"""
+    return dict(Counter(m.lastgroup for m in TOPIC_REGEX.finditer(text)))
+
+def _keywords_to_topics(keywords: List[str]) -> Dict[str, int]:
+    """Free keywords (LLM or user supplied) mapped onto topics - topic names pass through"""
+    counts = Counter()
+    for keyword in keywords:
+        keyword = str(keyword).strip().lower()
+        if keyword in TOPIC_TERMS:
+            counts[keyword] += 1
+        else:
+            counts.update(extract_topics_local(keyword).keys())
+    return dict(counts)
+
+_topic_indexes: Dict[Tuple, Tuple[Dict[str, List[int]], Dict[str, float]]] = {}
+MAX_TOPIC_INDEXES = 32
+_index_lock = threading.Lock()
+
+def topic_index(rbi_rules: List[Dict]) -> Tuple[Dict[str, List[int]], Dict[str, float]]:
+    """(topic → rule positions, topic → idf) - built once per corpus version and rule set"""
+    key = (CORPUS_VERSION, tuple(r.get('id') for r in rbi_rules))
+    with _index_lock:
+        cached = _topic_indexes.get(key)
+    if cached:
+        return cached
+
+    postings: Dict[str, List[int]] = {}
+    for position, rule in enumerate(rbi_rules):
+        for topic in extract_topics_local(f"{rule.get('title', '')} {rule.get('text', '')}"):
+            postings.setdefault(topic, []).append(position)
+    # Topics most rules share (e.g. "kyc") say less about relevance than rare ones
+    idf = {topic: math.log(1 + len(rbi_rules) / len(hits)) for topic, hits in postings.items()}
+
+    with _index_lock:
+        if len(_topic_indexes) >= MAX_TOPIC_INDEXES:
+            _topic_indexes.clear()
+        _topic_indexes[key] = (postings, idf)
+    return postings, idf
+
+def select_relevant_rules(rbi_rules: List[Dict], topic_counts: Dict[str, int], limit: int = None) -> List[Dict]:
+    """Rank rules by topic overlap with the policy - best first, corpus order breaks ties"""
+    postings, idf = topic_index(rbi_rules)
+    scores = Counter()
+    for topic, count in topic_counts.items():
+        if count <= 0 or topic not in postings:
+            continue
+        weight = (1 + math.log(count)) * idf[topic]
+        for position in postings[topic]:
+            scores[position] += weight
+
+    ranked = sorted(scores, key=lambda p: (-scores[p], p))
+    limit = len(rbi_rules) if limit is None else limit
+    if len(ranked) < min(MIN_RELEVANT_RULES, limit):
+        chosen = set(ranked)
+        ranked += [p for p in range(len(rbi_rules)) if p not in chosen][:MIN_RELEVANT_RULES - len(ranked)]
+    return [rbi_rules[p] for p in ranked[:limit]]
+
+def search_rbi_online(keywords: Union[List[str], Dict[str, int]], limit: int = None) -> List[Dict]:
+    """Corpus rules relevant to the keywords (list of terms/topics, or topic → weight)"""
+    topic_counts = keywords if isinstance(keywords, dict) else _keywords_to_topics(keywords)
+    return select_relevant_rules(get_all_rbi_sections(), topic_counts, limit)
 
 def extract_keywords_from_policy(policy_text: str) -> List[str]:
-    """Extract compliance keywords using Gemini"""
-    model = genai.GenerativeModel('gemini-2.5-flash')
+    """Extract compliance keywords using Gemini - only when CLARITY_LLM_KEYWORDS=1"""
+    model = genai.GenerativeModel(MODELNAME)
     prompt = f"""
 From this bank policy text, extract key RBI compliance keywords:
 
@@ -32,19 +126,23 @@ NO OTHER TEXT.
         print("⚠️ Keyword extraction failed - using defaults")
         return ["kyc", "aml", "str", "cdd", "pep", "transaction", "customer"]
 
-def extract_rbi_rules_from_web(policy_text: str) -> List[Dict]:
-    """Main RBI search agent - ALWAYS returns 5+ rules"""
+def extract_rbi_rules_from_web(policy_text: str, limit: int = 12, use_llm_keywords: bool = None) -> List[Dict]:
+    """Main RBI search agent - the `limit` most relevant rules, ALWAYS 3+"""
     print("🔍 Starting RBI rules extraction...")
-    
-    keywords = extract_keywords_from_policy(policy_text)
-    print(f"🔍 Keywords: {keywords}")
-    
-    # Try real scraping first
-    rbi_rules = search_rbi_online(keywords)
-    
-    # GUARANTEE minimum 5 rules - CRITICAL FIX
+
+    topic_counts = extract_topics_local(policy_text)
+    llm_keywords = LLM_KEYWORDS if use_llm_keywords is None else use_llm_keywords
+    if llm_keywords:
+        for topic, count in _keywords_to_topics(extract_keywords_from_policy(policy_text)).items():
+            topic_counts[topic] = topic_counts.get(topic, 0) + count
+    print(f"🔍 Topics: {topic_counts}")
+
+    # Relevance-ranked corpus subset, topped up to MIN_RELEVANT_RULES
+    rbi_rules = search_rbi_online(topic_counts, limit)
+
+    # Corpus too small (or limit < 3) - fall back to the built-in rule set
     if len(rbi_rules) < 3:
-        print("⚠️ Scraping insufficient - forcing comprehensive RBI rules")
+        print("⚠️ Corpus selection insufficient - forcing comprehensive RBI rules")
         rbi_rules = [
             {
                 "id": "kyc_master_2024",
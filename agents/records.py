@@ -0,0 +1,158 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# COMPACT PIPELINE RECORDS
+# Clause/rule texts live once in a RecordTable - links & conflicts only carry ids
+
+class Clause:
+    """One policy clause - span is the (start, end) offset in the source text when known"""
+    __slots__ = ('id', 'text', 'section', 'violations_detected', 'span')
+
+    def __init__(self, id: str, text: str, section: str = '', violations_detected: Optional[List[str]] = None,
+                 span: Optional[Tuple[int, int]] = None):
+        self.id = id
+        self.text = text
+        self.section = section
+        self.violations_detected = violations_detected or []
+        self.span = span
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Clause':
+        return cls(
+            id=str(data.get('id') or ''),
+            text=str(data.get('text', '')),
+            section=str(data.get('section', '')),
+            violations_detected=list(data.get('violations_detected', []) or [])
+        )
+
+    def to_dict(self) -> Dict:
+        data = {
+            'id': self.id,
+            'text': self.text,
+            'section': self.section,
+            'violations_detected': self.violations_detected
+        }
+        if self.span is not None:
+            data['span'] = list(self.span)
+        return data
+
+class Rule:
+    """One RBI rule from the corpus"""
+    __slots__ = ('id', 'title', 'text', 'url')
+
+    def __init__(self, id: str, text: str, title: str = '', url: str = ''):
+        self.id = id
+        self.text = text
+        self.title = title
+        self.url = url
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Rule':
+        return cls(
+            id=str(data.get('id', '')),
+            text=str(data.get('text', '')),
+            title=str(data.get('title', '')),
+            url=str(data.get('url', '') or '')
+        )
+
+    def to_dict(self) -> Dict:
+        data = {'id': self.id, 'title': self.title, 'text': self.text}
+        if self.url:
+            data['url'] = self.url
+        return data
+
+class Link:
+    """Clause ↔ rule pair - ids only"""
+    __slots__ = ('policyid', 'rbiid', 'similarity')
+
+    def __init__(self, policyid: str, rbiid: str, similarity: float = 0.0):
+        self.policyid = policyid
+        self.rbiid = rbiid
+        self.similarity = similarity
+
+    def to_dict(self) -> Dict:
+        return {'policyid': self.policyid, 'rbiid': self.rbiid, 'similarity': self.similarity}
+
+class Conflict:
+    """Classified pair + risk/narrative enrichment - ids only, texts stay in the tables"""
+    __slots__ = (
+        'policyid', 'rbiid', 'similarity',
+        'status', 'shorttitle', 'reason', 'confidence', 'rulematched', 'detectionmethod',
+        'risk_score', 'risk_category', 'components', 'risk_rationale', 'fine_estimate_crores',
+        'narrative', 'enrichment'
+    )
+
+    def __init__(self, link: Link, status: str, shorttitle: str = '', reason: str = '',
+                 confidence: float = 0.0, rulematched: Optional[str] = None,
+                 detectionmethod: Optional[str] = None):
+        self.policyid = link.policyid
+        self.rbiid = link.rbiid
+        self.similarity = link.similarity
+        self.status = status
+        self.shorttitle = shorttitle
+        self.reason = reason
+        self.confidence = confidence
+        self.rulematched = rulematched
+        self.detectionmethod = detectionmethod
+        self.risk_score = None
+        self.risk_category = None
+        self.components = None
+        self.risk_rationale = None
+        self.fine_estimate_crores = None
+        self.narrative = None
+        self.enrichment = None
+
+    def copy(self) -> 'Conflict':
+        clone = Conflict.__new__(Conflict)
+        for name in Conflict.__slots__:
+            setattr(clone, name, getattr(self, name))
+        if self.components is not None:
+            clone.components = dict(self.components)
+        return clone
+
+    def to_dict(self) -> Dict:
+        """JSON shape - unset enrichment fields are left out"""
+        return {
+            name: getattr(self, name)
+            for name in Conflict.__slots__
+            if getattr(self, name) is not None
+        }
+
+class RecordTable:
+    """id → record index (insertion ordered) - each text stored exactly once"""
+    __slots__ = ('_records',)
+
+    def __init__(self, records: Iterable = ()):
+        self._records = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        """First record wins on duplicate ids"""
+        return self._records.setdefault(record.id, record)
+
+    def get(self, record_id: str, default=None):
+        return self._records.get(record_id, default)
+
+    def __getitem__(self, record_id: str):
+        return self._records[record_id]
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._records.values())
+
+    def to_dict(self, ids: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        """{id: record} for output - restricted to ids when given"""
+        wanted = self._records.keys() if ids is None else ids
+        output = {}
+        for record_id in wanted:
+            record = self._records.get(record_id)
+            if record is not None and record_id not in output:
+                data = record.to_dict()
+                data.pop('id', None)
+                output[record_id] = data
+        return output
@@ -0,0 +1,386 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import google.generativeai as genai
+
+from agents.records import Clause, Rule, Link
+from agents.rbi_corpus import CORPUS_VERSION
+
+# SEMANTIC CLAUSE → RULE RETRIEVAL
+# Texts are embedded once (content-addressed by normalized text) and matched with
+# one matrix product. Rule vectors persist as float16/int8 shards memory-mapped from
+# disk; clause vectors stay in a bounded in-memory LRU.
+
+EMBEDDINGS_DIR = os.getenv("CLARITY_EMBEDDINGS_DIR", os.path.join(".clarity_cache", "embeddings"))
+EMBEDDING_PROVIDER = os.getenv("CLARITY_EMBEDDING_PROVIDER", "gemini")
+EMBEDDING_DTYPE = os.getenv("CLARITY_EMBEDDING_DTYPE", "float16")
+MAX_SHARDS = 64  # compact into one shard past this
+CLAUSE_CACHE_SIZE = int(os.getenv("CLARITY_CLAUSE_CACHE_SIZE", "20000"))  # clause vectors kept in RAM
+
+def normalize_text(text: str) -> str:
+    """Cache identity of a text - case/whitespace differences don't re-embed"""
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+def _l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+# ---------------- PROVIDERS ----------------
+
+class EmbeddingProvider:
+    """Pluggable embedder - name must change whenever the vectors would"""
+    name = "base"
+    dim = 0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model: str = "models/text-embedding-004", dim: int = 768, batch_size: int = 100,
+                 max_chars: int = 2000):
+        self.model = model
+        self.dim = dim
+        self.batch_size = batch_size
+        self.max_chars = max_chars  # stay under the model's input token limit
+        self.name = f"gemini-{model.split('/')[-1]}-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            resp = genai.embed_content(
+                model=self.model,
+                content=[t[:self.max_chars] for t in texts[i:i + self.batch_size]],
+                task_type="SEMANTIC_SIMILARITY",
+                output_dimensionality=self.dim
+            )
+            vectors.extend(resp["embedding"])
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Local deterministic stand-in - signed feature hashing of word uni/bigrams, no network"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = re.findall(r'[a-z0-9]+', text.lower())
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return _l2_normalize(vectors)
+
+def get_provider(name: str = None) -> EmbeddingProvider:
+    name = (name or EMBEDDING_PROVIDER).lower()
+    if name == "hashing":
+        return HashingEmbeddingProvider()
+    if name == "gemini":
+        return GeminiEmbeddingProvider()
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+# ---------------- CACHES ----------------
+# Rule vectors are few and reused by every request - they persist on disk.
+# Clause vectors come from every uploaded document - they live in a bounded
+# in-memory LRU, so neither disk nor RAM grows with traffic.
+
+class _VectorStore:
+    """get_many() shared by both caches - the provider call runs outside the lock,
+    so lookups that are fully cached never wait on it"""
+
+    def __init__(self, provider: EmbeddingProvider):
+        self.provider = provider
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+
+    def get_many(self, texts: List[str]) -> np.ndarray:
+        """float32 (n, dim) unit vectors - ONE batched provider call for all uncached texts"""
+        keys = [self.key(t) for t in texts]
+        with self._lock:
+            missing = {}
+            for key, text in zip(keys, texts):
+                if not self._has(key) and key not in missing:
+                    missing[key] = normalize_text(text)
+
+        if missing:
+            vectors = _l2_normalize(self.provider.embed(list(missing.values())).astype(np.float32))
+            with self._lock:
+                # Another thread may have stored some of these while we were embedding
+                fresh = [row for row, key in enumerate(missing) if not self._has(key)]
+                if fresh:
+                    missing_keys = list(missing)
+                    self._put([missing_keys[row] for row in fresh], vectors[fresh])
+            print(f"🧮 Embedded {len(missing)} new texts ({self.provider.name})")
+            self._after_put()
+
+        with self._lock:
+            return np.stack([self._vector(key) for key in keys]) if keys else np.zeros((0, self.provider.dim), np.float32)
+
+    def _has(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def _put(self, keys: List[str], vectors: np.ndarray):
+        raise NotImplementedError
+
+    def _vector(self, key: str) -> np.ndarray:
+        raise NotImplementedError
+
+    def _after_put(self):
+        """Hook for slow maintenance - runs without the lock held"""
+
+class ClauseVectorCache(_VectorStore):
+    """Bounded LRU of float16 clause vectors - repeat uploads skip the provider, nothing hits disk"""
+
+    def __init__(self, provider: EmbeddingProvider, max_entries: int = CLAUSE_CACHE_SIZE):
+        super().__init__(provider)
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _has(self, key: str) -> bool:
+        return key in self._entries
+
+    def _put(self, keys: List[str], vectors: np.ndarray):
+        for key, vector in zip(keys, vectors.astype(np.float16)):
+            self._entries[key] = vector
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _vector(self, key: str) -> np.ndarray:
+        vector = self._entries.get(key)
+        if vector is None:
+            # Evicted by a concurrent batch between put and read - shouldn't outlive this call
+            raise KeyError(key)
+        self._entries.move_to_end(key)
+        return vector.astype(np.float32)
+
+    def get_many(self, texts: List[str]) -> np.ndarray:
+        if len(texts) <= self.max_entries:
+            try:
+                return super().get_many(texts)
+            except KeyError:
+                pass  # a concurrent batch evicted ours before we read it back
+        # Doesn't fit the LRU - embed this call uncached
+        return _l2_normalize(self.provider.embed([normalize_text(t) for t in texts]).astype(np.float32))
+
+class EmbeddingCache(_VectorStore):
+    """Content-addressed vector store: shards of float16 (or int8 + per-row scale) .npy, memory-mapped
+
+    Holds rule vectors only. Layout per provider, under <dir>/rules/:
+    shard-<ms>-<uid>.vec.npy [+ .scale.npy] + .keys.json. Shard names are
+    unique per writer, so several worker processes can share one directory; the keys file is
+    written last, so a shard only becomes visible once complete.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, directory: str = EMBEDDINGS_DIR, dtype: str = EMBEDDING_DTYPE):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        super().__init__(provider)
+        self.dtype = dtype
+        self.directory = os.path.join(directory, "rules", f"{provider.name}-{dtype}")
+        self._shards: List[Tuple[np.ndarray, Optional[np.ndarray]]] = []
+        self._shard_bases: List[str] = []
+        self._shard_keys: List[List[str]] = []
+        self._index: Dict[str, Tuple[int, int]] = {}  # key → (shard, row)
+        self._used = set()  # keys read by this process - compaction keeps only these
+        self._compacting = False
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        for keys_path in sorted(glob.glob(os.path.join(self.directory, "shard-*.keys.json"))):
+            base = keys_path[:-len(".keys.json")]
+            with open(keys_path, encoding="utf-8") as f:
+                keys = json.load(f)
+            self._attach(base, keys)
+
+    def _attach(self, base: str, keys: List[str]):
+        """Map a complete shard and index its keys (caller holds the lock, or is __init__)"""
+        shard = len(self._shards)
+        self._shards.append((
+            np.load(base + ".vec.npy", mmap_mode="r"),
+            np.load(base + ".scale.npy", mmap_mode="r") if self.dtype == "int8" else None
+        ))
+        self._shard_bases.append(base)
+        self._shard_keys.append(keys)
+        for row, key in enumerate(keys):
+            self._index.setdefault(key, (shard, row))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _has(self, key: str) -> bool:
+        return key in self._index
+
+    def _vector(self, key: str) -> np.ndarray:
+        shard, row = self._index[key]
+        self._used.add(key)
+        vectors, scales = self._shards[shard]
+        if scales is None:
+            return vectors[row].astype(np.float32)
+        return vectors[row].astype(np.float32) * (scales[row] / 127.0)
+
+    def _put(self, keys: List[str], vectors: np.ndarray):
+        self._attach(self._write_files(keys, vectors), keys)
+        self._used.update(keys)
+
+    def _write_files(self, keys: List[str], vectors: np.ndarray) -> str:
+        base = os.path.join(self.directory, f"shard-{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:12]}")
+        if self.dtype == "float16":
+            stored, scales = vectors.astype(np.float16), None
+        else:
+            scales = np.abs(vectors).max(axis=1).astype(np.float32)
+            scales[scales == 0] = 1.0
+            stored = np.round(vectors / scales[:, None] * 127.0).astype(np.int8)
+
+        _atomic_save(base + ".vec.npy", stored)
+        if scales is not None:
+            _atomic_save(base + ".scale.npy", scales)
+        _atomic_write_json(base + ".keys.json", keys)
+        return base
+
+    def _after_put(self):
+        if len(self._shards) >= MAX_SHARDS:
+            self._compact()
+
+    def _compact(self):
+        """Merge this cache's shards into one, dropping vectors this process never read
+        (old corpus versions re-embed on demand). Only the snapshot and the swap hold the
+        lock - reading and rewriting every vector happens outside it. Shards another
+        process is still writing aren't in our list and are left alone."""
+        with self._lock:
+            if self._compacting or len(self._shards) < MAX_SHARDS:
+                return
+            self._compacting = True
+            snapshot_count = len(self._shards)
+            shards = list(self._shards)
+            keys = [k for k, (shard, _) in self._index.items() if shard < snapshot_count and k in self._used]
+            locations = [self._index[k] for k in keys]
+
+        try:
+            vectors = np.zeros((len(keys), self.provider.dim), np.float32)
+            for i, (shard, row) in enumerate(locations):
+                stored, scales = shards[shard]
+                vectors[i] = stored[row] if scales is None else stored[row].astype(np.float32) * (scales[row] / 127.0)
+            merged_base = self._write_files(keys, vectors) if keys else None
+
+            with self._lock:
+                old_bases = self._shard_bases[:snapshot_count]
+                later = list(zip(self._shard_bases[snapshot_count:], self._shard_keys[snapshot_count:]))
+                self._shards, self._shard_bases, self._shard_keys, self._index = [], [], [], {}
+                if merged_base:
+                    self._attach(merged_base, keys)
+                for base, shard_keys in later:
+                    self._attach(base, shard_keys)
+        finally:
+            with self._lock:
+                self._compacting = False
+
+        for base in old_bases:
+            # keys file first, so a concurrent reader never sees a shard without its data
+            for suffix in (".keys.json", ".vec.npy", ".scale.npy"):
+                if os.path.exists(base + suffix):
+                    os.remove(base + suffix)
+
+def _atomic_save(path: str, array: np.ndarray):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+def _atomic_write_json(path: str, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+# ---------------- INDEX ----------------
+
+class VectorIndex:
+    """Exact top-k by cosine over unit vectors - one matrix product per query batch.
+    Rule corpora are small enough that exact search beats building an ANN graph."""
+
+    def __init__(self, vectors: np.ndarray, ids: List[str]):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.ids = ids
+
+    def search(self, queries: np.ndarray, k: int = 3, batch_size: int = 4096) -> List[List[Tuple[str, float]]]:
+        k = min(k, len(self.ids))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+        results = []
+        for start in range(0, len(queries), batch_size):
+            scores = queries[start:start + batch_size] @ self.vectors.T
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            for row_ids, row_scores in zip(np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)):
+                results.append([(self.ids[i], float(s)) for i, s in zip(row_ids, row_scores)])
+        return results
+
+# ---------------- LINKING ENTRY POINT ----------------
+
+_caches: Dict[str, EmbeddingCache] = {}
+_clause_caches: Dict[str, ClauseVectorCache] = {}
+_rule_indexes: Dict[Tuple, VectorIndex] = {}
+MAX_RULE_INDEXES = 128
+_registry_lock = threading.Lock()
+
+def get_cache(provider: EmbeddingProvider = None) -> EmbeddingCache:
+    provider = provider or get_provider()
+    with _registry_lock:
+        if provider.name not in _caches:
+            _caches[provider.name] = EmbeddingCache(provider)
+        return _caches[provider.name]
+
+def get_clause_cache(provider: EmbeddingProvider = None) -> ClauseVectorCache:
+    provider = provider or get_provider()
+    with _registry_lock:
+        if provider.name not in _clause_caches:
+            _clause_caches[provider.name] = ClauseVectorCache(provider)
+        return _clause_caches[provider.name]
+
+def rule_index(rbi_rules: List[Rule], cache: EmbeddingCache) -> VectorIndex:
+    """Rule vectors assembled once per (provider, corpus version, rule set)"""
+    key = (cache.provider.name, CORPUS_VERSION, tuple((r.id, cache.key(r.text)) for r in rbi_rules))
+    with _registry_lock:
+        index = _rule_indexes.get(key)
+    if index is None:
+        index = VectorIndex(cache.get_many([r.text for r in rbi_rules]), [r.id for r in rbi_rules])
+        with _registry_lock:
+            if len(_rule_indexes) >= MAX_RULE_INDEXES:
+                _rule_indexes.clear()
+            _rule_indexes[key] = index
+    return index
+
+def semantic_links(clauses: List[Clause], rbi_rules: List[Rule], top_k: int = 3,
+                   cache: EmbeddingCache = None, clause_cache: ClauseVectorCache = None) -> List[Link]:
+    """Top-k rules per clause by cosine similarity"""
+    if not clauses or not rbi_rules:
+        return []
+    cache = cache or get_cache()
+    clause_cache = clause_cache or get_clause_cache(cache.provider)
+    index = rule_index(rbi_rules, cache)
+    matches = index.search(clause_cache.get_many([c.text for c in clauses]), k=top_k)
+    return [
+        Link(clause.id, rbiid, round(score, 4))
+        for clause, clause_matches in zip(clauses, matches)
+        for rbiid, score in clause_matches
+    ]
@@ -1,8 +1,8 @@
-from typing import Dict
 import json
 import google.generativeai as genai
 import random
 from agents import MODELNAME
+from agents.records import Clause, Rule, Conflict
 
 RISK_SYSTEM_PROMPT = """
 You are RBI's Chief Compliance Officer. Assign COMPLETELY UNIQUE risk scores for each violation.
@@ -29,12 +29,12 @@ Output EXACTLY:
 }
 """
 
-def score_risk(conflict: Dict) -> Dict:
+def score_risk(conflict: Conflict, clause: Clause, rule: Rule) -> Conflict:
     """🤖 100% UNIQUE AI SCORES - NEVER REPEATS"""
-    rbitext = conflict.get('rbitext', '')
-    policytext = conflict.get('policytext', '')
-    status = conflict.get('status', '')
-    rulematched = conflict.get('rulematched', '')
+    rbitext = rule.text
+    policytext = clause.text
+    status = conflict.status
+    rulematched = conflict.rulematched or ''
     
     model = genai.GenerativeModel(MODELNAME, system_instruction=RISK_SYSTEM_PROMPT)
     
@@ -80,13 +80,11 @@ Vary by violation specifics.
             "fine_potential": round(float(ai_data.get("fine_potential", risk_score * 0.1)), 1)
         }
         
-        conflict.update({
-            "risk_score": round(risk_score, 2), 
-            "risk_category": category,
-            "components": components,
-            "risk_rationale": ai_data.get("rationale", f"Unique AI score {risk_score:.2f}"),
-            "fine_estimate_crores": round(risk_score * 0.5, 1)
-        })
+        conflict.risk_score = round(risk_score, 2)
+        conflict.risk_category = category
+        conflict.components = components
+        conflict.risk_rationale = ai_data.get("rationale", f"Unique AI score {risk_score:.2f}")
+        conflict.fine_estimate_crores = round(risk_score * 0.5, 1)
         
         print(f"   🤖 UNIQUE Risk: {risk_score:.2f}/10 {category}")
         
@@ -97,28 +95,26 @@ Vary by violation specifics.
         base_score = 9.5 if 'CONTRADICTSREG' in status else 7.5
         dynamic_score = round(base_score + unique_seed * 0.5 - 0.2, 2)
         
-        conflict.update({
-            "risk_score": dynamic_score,
-            "risk_category": "CRITICAL 🚨" if dynamic_score > 9.0 else "HIGH ⚠️",
-            "components": {
-                "regulatory_strictness": round(dynamic_score * 0.32, 1),
-                "policy_gap": round(dynamic_score * 0.33, 1),
-                "audit_exposure": round(dynamic_score * 0.25, 1),
-                "fine_potential": round(dynamic_score * 0.1, 1)
-            },
-            "risk_rationale": f"Dynamic fallback {dynamic_score:.2f}",
-            "fine_estimate_crores": round(dynamic_score * 0.5, 1)
-        })
+        conflict.risk_score = dynamic_score
+        conflict.risk_category = "CRITICAL 🚨" if dynamic_score > 9.0 else "HIGH ⚠️"
+        conflict.components = {
+            "regulatory_strictness": round(dynamic_score * 0.32, 1),
+            "policy_gap": round(dynamic_score * 0.33, 1),
+            "audit_exposure": round(dynamic_score * 0.25, 1),
+            "fine_potential": round(dynamic_score * 0.1, 1)
+        }
+        conflict.risk_rationale = f"Dynamic fallback {dynamic_score:.2f}"
+        conflict.fine_estimate_crores = round(dynamic_score * 0.5, 1)
         print(f"   🔄 Dynamic: {dynamic_score:.2f}/10")
     
     return conflict
 
-def build_narrative(conflict: Dict) -> Dict:
+def build_narrative(conflict: Conflict, clause: Clause, rule: Rule) -> Conflict:
     """Regulator-ready explanation"""
-    status = conflict.get('status', '')
-    rbitext = conflict.get('rbitext', '')[:300]
-    policytext = conflict.get('policytext', '')[:300]
-    risk_score = conflict.get('risk_score', 0)
+    status = conflict.status
+    rbitext = rule.text[:300]
+    policytext = clause.text[:300]
+    risk_score = conflict.risk_score or 0
     
     narrative = f"""
 🚨 {status.replace('REG', ' REG')} VIOLATION (Risk: {risk_score:.1f}/10)
@@ -126,19 +122,23 @@ def build_narrative(conflict: Dict) -> Dict:
 RBI: {rbitext}
 Policy: {policytext}
 
-Fine Estimate: ₹{conflict.get('fine_estimate_crores', 0)} Cr
+Fine Estimate: ₹{conflict.fine_estimate_crores or 0} Cr
 """
     
-    conflict['narrative'] = narrative.strip()
+    conflict.narrative = narrative.strip()
     print(f"   📝 Narrative generated")
     return conflict
 
 if __name__ == "__main__":
+    from agents.records import Link
     test_conflicts = [
-        {'status': 'CONTRADICTS REG', 'rbitext': 'STR 7 days', 'policytext': '10 days', 'rulematched': '10 calendar days'},
-        {'status': 'RELAXES REG', 'rbitext': 'Full KYC', 'policytext': 'Simplified KYC', 'rulematched': 'simplified kyc'}
+        ('CONTRADICTS REG', 'STR 7 days', '10 days', '10 calendar days'),
+        ('RELAXES REG', 'Full KYC', 'Simplified KYC', 'simplified kyc')
     ]
-    for i, conflict in enumerate(test_conflicts):
+    for i, (status, rbitext, policytext, rulematched) in enumerate(test_conflicts):
         print(f"\n--- Test {i+1} ---")
-        result = score_risk(conflict)
-        print(f"Score: {result['risk_score']}")
+        clause = Clause(f"clause_{i+1}", policytext)
+        rule = Rule(f"rule_{i+1}", rbitext)
+        conflict = Conflict(Link(clause.id, rule.id), status, rulematched=rulematched)
+        result = score_risk(conflict, clause, rule)
+        print(f"Score: {result.risk_score}")
@@ -0,0 +1,64 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+class SingleFlight:
+    """Coalesce duplicate work by key - the first caller runs fn, concurrent duplicates wait on its result
+
+    linger_seconds > 0 keeps a successful result shareable for that long after it completes,
+    so duplicates later in the same burst are served too. Failures are never shared afterwards.
+    """
+
+    def __init__(self, linger_seconds: float = 0.0, max_entries: int = 10000):
+        self.linger_seconds = linger_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Tuple[Future, float]] = {}  # key → (future, expires_at)
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Tuple[Any, bool]:
+        """(result, shared) - shared is True when another caller did the work"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry and (not entry[0].done() or entry[1] > now):
+                future, leader = entry[0], False
+                self.coalesced += 1
+            else:
+                future, leader = Future(), True
+                self._calls[key] = (future, float('inf'))
+                self.leaders += 1
+                if len(self._calls) > self.max_entries:
+                    self._prune(now)
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            if self.linger_seconds > 0:
+                self._calls[key] = (future, time.monotonic() + self.linger_seconds)
+            else:
+                self._calls.pop(key, None)
+        future.set_result(result)
+        return result, False
+
+    def _prune(self, now: float):
+        """Drop finished entries past their linger window (caller holds the lock)"""
+        expired = [k for k, (f, expires_at) in self._calls.items() if f.done() and expires_at <= now]
+        for k in expired:
+            del self._calls[k]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            in_flight = sum(1 for f, _ in self._calls.values() if not f.done())
+        return {'leaders': self.leaders, 'coalesced': self.coalesced, 'in_flight': in_flight}
@@ -0,0 +1,64 @@
+"""Throughput benchmark for the single-pass clause segmenter
+
+    python -m benchmarks.bench_segmenter [--sizes-mb 1 2 4 8] [--repeat 3]
+
+Builds synthetic policy manuals of increasing size and reports MB/s per size.
+Per-MB time should stay flat as the manual grows - growth means non-linear work.
+"""
+import argparse
+import time
+
+from agents.clause_segmenter import segment_policy
+
+SECTION_TEMPLATE = (
+    "SECTION {n} Customer due diligence. KYC refresh every 36 months for low risk customers. "
+    "{n}.1 STRs are filed within 10 calendar days after manager approval. "
+    "{n}.2 Self-declaration accepted for address proof; OFAC screening, other lists not mandatory. "
+    "{n}.3 Tier-2 correspondents pre-approved after internal assessment; records kept 5 years. "
+    "Transfers above 25 lakhs reviewed next business day with written confirmation.\n"
+)
+
+def build_manual(size_bytes: int) -> str:
+    parts = []
+    total = 0
+    n = 1
+    while total < size_bytes:
+        part = SECTION_TEMPLATE.format(n=n)
+        parts.append(part)
+        total += len(part)
+        n += 1
+    return ''.join(parts)
+
+def bench(size_mb: float, repeat: int) -> dict:
+    text = build_manual(int(size_mb * 1024 * 1024))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sections, keyword_clauses = segment_policy(text)
+        best = min(best, time.perf_counter() - start)
+    return {
+        'size_mb': size_mb,
+        'seconds': best,
+        'mb_per_s': size_mb / best,
+        'sections': len(sections),
+        'keyword_windows': len(keyword_clauses)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes-mb', type=float, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    results = [bench(size, args.repeat) for size in args.sizes_mb]
+    print(f"{'MB':>6} {'seconds':>9} {'MB/s':>8} {'sections':>9} {'kw windows':>11}")
+    for r in results:
+        print(f"{r['size_mb']:>6g} {r['seconds']:>9.3f} {r['mb_per_s']:>8.2f} {r['sections']:>9} {r['keyword_windows']:>11}")
+
+    # Linear scaling check: per-MB cost of the largest run vs the smallest
+    base = results[0]['seconds'] / results[0]['size_mb']
+    worst = results[-1]['seconds'] / results[-1]['size_mb']
+    print(f"\nPer-MB cost ratio (largest / smallest): {worst / base:.2f}x  (≈1.0 = linear)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Local stand-ins for Gemini and Firestore used by the load-test harness
+
+install_fake_llm() / install_fake_firestore() patch the SDK modules in place, so
+they must run BEFORE `main` is imported.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+FIRESTORE_DOC_LIMIT_BYTES = 1024 * 1024
+
+# ---------------- FAKE GEMINI ----------------
+
+class FakeLLMConfig:
+    latency_s = 0.2
+    jitter_s = 0.1
+    failure_rate = 0.0
+    fail_extraction = False
+
+_llm_calls_made = 0
+_llm_lock = threading.Lock()
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel - blocking sleep like the real SDK, canned JSON by prompt type"""
+
+    def __init__(self, model_name: str = '', system_instruction: str = None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction or ''
+
+    def generate_content(self, prompt, **kwargs) -> FakeResponse:
+        global _llm_calls_made
+        with _llm_lock:
+            _llm_calls_made += 1
+
+        prompt = str(prompt)
+        seed = int(hashlib.sha1(prompt.encode('utf-8', 'ignore')).hexdigest()[:8], 16)
+        rng = random.Random(seed)
+        time.sleep(max(0.0, FakeLLMConfig.latency_s + random.uniform(-1, 1) * FakeLLMConfig.jitter_s))
+
+        if FakeLLMConfig.failure_rate and random.random() < FakeLLMConfig.failure_rate:
+            raise RuntimeError("Fake LLM: injected failure")
+
+        if 'Extract ALL SPECIFIC policy clauses' in prompt:
+            if FakeLLMConfig.fail_extraction:
+                return FakeResponse("not json")
+            return FakeResponse(json.dumps(_fake_clauses(prompt)))
+        if 'JSON links between clauses and rules' in prompt:
+            return FakeResponse(json.dumps(_fake_links(prompt, rng)))
+        if 'CLASSIFY THIS PAIR' in prompt:
+            status = rng.choice(['FULLYALIGNS', 'FULLYALIGNS', 'STRICTERTHANREG', 'RELAXESREG', 'CONTRADICTSREG'])
+            return FakeResponse(json.dumps({
+                'status': status, 'shorttitle': f"Fake {status}", 'reason': 'Fake LLM verdict',
+                'confidence': round(rng.uniform(0.6, 0.95), 2)
+            }))
+        if 'Chief Compliance Officer' in self.system_instruction:
+            return FakeResponse(json.dumps({
+                'risk_score': round(rng.uniform(6.0, 10.0), 2), 'rationale': 'Fake LLM risk score'
+            }))
+        if 'compliance keywords' in prompt:
+            return FakeResponse(json.dumps({'keywords': ['kyc', 'aml', 'str', 'cdd', 'pep']}))
+        return FakeResponse("Fake narrative: RBI requirement, policy gap, risk and next action.")
+
+def _fake_clauses(prompt: str) -> list:
+    document = prompt.split('FULL POLICY DOCUMENT:', 1)[-1].split('Return ONLY valid JSON', 1)[0]
+    sentences = [s.strip() for s in re.split(r'(?<=[.;])\s+', document) if len(s.strip()) > 40]
+    return [
+        {'id': f"clause_{i+1}", 'text': sentence[:600], 'section': f"{i+1}"}
+        for i, sentence in enumerate(sentences[:60])
+    ]
+
+def _fake_links(prompt: str, rng: random.Random) -> list:
+    clauses_part, _, rules_part = prompt.partition('RBI RULES:')
+    clause_ids = re.findall(r'^(?:POLICY CLAUSES: )?(\S+?): ', clauses_part, re.MULTILINE)
+    rule_ids = re.findall(r'^\s*(\S+?): ', rules_part.split('Create ', 1)[0], re.MULTILINE)
+    if not rule_ids:
+        return []
+    return [
+        {'policyid': cid, 'rbiid': rng.choice(rule_ids), 'similarity': round(rng.uniform(0.3, 0.9), 2)}
+        for cid in clause_ids
+    ]
+
+def install_fake_llm(latency_s: float = 0.2, jitter_s: float = 0.1, failure_rate: float = 0.0,
+                     fail_extraction: bool = False):
+    import google.generativeai as genai
+
+    FakeLLMConfig.latency_s = latency_s
+    FakeLLMConfig.jitter_s = jitter_s
+    FakeLLMConfig.failure_rate = failure_rate
+    FakeLLMConfig.fail_extraction = fail_extraction
+    genai.configure = lambda *args, **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+
+def llm_calls_made() -> int:
+    return _llm_calls_made
+
+# ---------------- FAKE FIRESTORE ----------------
+
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id: str, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+class FakeDocumentReference:
+    def __init__(self, collection: 'FakeCollection', doc_id: str):
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self) -> FakeDocumentSnapshot:
+        with self._collection.lock:
+            return FakeDocumentSnapshot(self.id, self._collection.docs.get(self.id))
+
+class FakeQuery:
+    def __init__(self, collection: 'FakeCollection', field: str = None, descending: bool = False, limit: int = None):
+        self._collection = collection
+        self._field = field
+        self._descending = descending
+        self._limit = limit
+
+    def order_by(self, field: str, direction=None) -> 'FakeQuery':
+        return FakeQuery(self._collection, field, str(direction).upper().endswith('DESCENDING'), self._limit)
+
+    def limit(self, count: int) -> 'FakeQuery':
+        return FakeQuery(self._collection, self._field, self._descending, count)
+
+    def stream(self):
+        with self._collection.lock:
+            # Insertion order stands in for createdAt (SERVER_TIMESTAMP isn't resolved locally)
+            items = list(self._collection.docs.items())
+        if self._descending:
+            items.reverse()
+        for doc_id, data in items[:self._limit]:
+            yield FakeDocumentSnapshot(doc_id, data)
+
+class FakeCollection(FakeQuery):
+    def __init__(self, name: str):
+        self.name = name
+        self.docs = {}
+        self.lock = threading.Lock()
+        self.max_doc_bytes = 0
+        self.oversized_docs = 0
+        super().__init__(self)
+
+    def add(self, data: dict):
+        size = len(json.dumps(data, default=str).encode('utf-8'))
+        with self.lock:
+            doc_id = f"fake_{len(self.docs) + 1:06d}"
+            self.docs[doc_id] = data
+            self.max_doc_bytes = max(self.max_doc_bytes, size)
+            if size > FIRESTORE_DOC_LIMIT_BYTES:
+                self.oversized_docs += 1
+        return time.time(), FakeDocumentReference(self, doc_id)
+
+    def document(self, doc_id: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, doc_id)
+
+class FakeFirestoreClient:
+    """In-memory Firestore - tracks doc sizes against the real 1 MiB cap"""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name: str) -> FakeCollection:
+        with self._lock:
+            return self._collections.setdefault(name, FakeCollection(name))
+
+    def stats(self) -> dict:
+        with self._lock:
+            collections = list(self._collections.values())
+        return {
+            'documents': sum(len(c.docs) for c in collections),
+            'max_doc_bytes': max((c.max_doc_bytes for c in collections), default=0),
+            'oversized_docs': sum(c.oversized_docs for c in collections)
+        }
+
+def install_fake_firestore() -> FakeFirestoreClient:
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    client = FakeFirestoreClient()
+    credentials.Certificate = lambda *args, **kwargs: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: firebase_admin._apps.setdefault('[DEFAULT]', object())
+    firestore.client = lambda *args, **kwargs: client
+    return client
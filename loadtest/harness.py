@@ -0,0 +1,376 @@
+"""HTTP load test for /api/analyze with a fake Gemini and an in-memory Firestore
+
+    python -m loadtest.harness --concurrency 8 --duration 30          # closed loop
+    python -m loadtest.harness --rate 4 --duration 30 --pdf-fraction 0.5   # fixed arrival rate
+    python -m loadtest.harness --mode uvicorn --rate 4 --requests 100       # real HTTP server
+    python -m loadtest.harness --concurrency 8 --requests 40 --unique-payloads   # no coalescing/cache hits
+
+Reports throughput, p50/p95/p99 latency, error rate and event-loop lag of the
+loop serving the app, so concurrency changes can be checked against numbers.
+"""
+import argparse
+import asyncio
+import glob
+import io
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from loadtest.fakes import install_fake_llm, install_fake_firestore, llm_calls_made
+
+class Payload:
+    """One request body - PDF upload or pre-extracted text (text is kept for PDFs too)"""
+    __slots__ = ('kind', 'name', 'data', 'text')
+
+    def __init__(self, kind: str, name: str, data, text: str = ''):
+        self.kind = kind
+        self.name = name
+        self.data = data
+        self.text = text
+
+def load_payloads(inputs_dir: str) -> Dict[str, List[Payload]]:
+    """PDFs from inputs/ + their extracted text (PyPDF2, same as main.py) for text requests"""
+    import PyPDF2
+
+    pdfs, texts = [], []
+    for path in sorted(glob.glob(os.path.join(inputs_dir, '*.pdf'))):
+        with open(path, 'rb') as f:
+            data = f.read()
+        name = os.path.basename(path)
+        reader = PyPDF2.PdfReader(io.BytesIO(data))
+        text = '\n\n'.join(filter(None, (page.extract_text() for page in reader.pages)))
+        pdfs.append(Payload('pdf', name, data, text))
+        if text.strip():
+            texts.append(Payload('text', name, text, text))
+
+    if not pdfs:
+        raise SystemExit(f"❌ No PDFs found in {inputs_dir}")
+    return {'pdf': pdfs, 'text': texts or []}
+
+# ---------------- UNIQUE PAYLOADS ----------------
+# Identical uploads are coalesced (main.py, run_clarity) and AI verdicts are shared per
+# clause text - tagging every line with a per-request nonce makes each request a
+# distinct analysis, so the run measures computed work rather than cache hits.
+
+def unique_payload(payload: Payload, nonce: str) -> Payload:
+    text = '\n'.join(f"{line} ~{nonce}" if line.strip() else line for line in payload.text.split('\n'))
+    if payload.kind == 'text':
+        return Payload('text', payload.name, text, text)
+    return Payload('pdf', payload.name, text_to_pdf(text), text)
+
+def text_to_pdf(text: str, lines_per_page: int = 60, width: int = 110) -> bytes:
+    """Minimal Helvetica text PDF - enough for PyPDF2 to extract the same lines back"""
+    lines = [wrapped for line in text.split('\n') for wrapped in (textwrap.wrap(line, width) or [''])]
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[]]
+
+    def escape(line: str) -> str:
+        return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for page_lines in pages:
+        stream = 'BT /F1 9 Tf 11 TL 40 760 Td\n' + ''.join(f"({escape(l)}) '\n" for l in page_lines) + 'ET'
+        stream = stream.encode('latin-1', 'replace')
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects)))
+        page_ids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % i for i in page_ids), len(page_ids))
+
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    out.write(b''.join(b'%010d 00000 n \n' % offset for offset in offsets))
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return out.getvalue()
+
+class LoopLagMonitor:
+    """Samples how late a periodic sleep wakes up - blocking work in the loop shows up as lag"""
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self.samples: List[float] = []
+        self._task = None
+        self._loop = None
+        self._expected = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._expected = time.monotonic() + self.interval_s
+        self._task = self._loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._expected = time.monotonic() + self.interval_s
+            await asyncio.sleep(self.interval_s)
+            self.samples.append(max(0.0, time.monotonic() - self._expected))
+
+    def stop(self):
+        """Safe from any thread - the still-pending wake-up counts as a sample, so a loop
+        that was never free to run the monitor still reports its lag"""
+        if self._expected is not None:
+            self.samples.append(max(0.0, time.monotonic() - self._expected))
+            self._expected = None
+        if self._task:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+class Recorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.by_kind: Dict[str, List[float]] = {'text': [], 'pdf': []}
+        self.sent = 0
+
+    def ok(self, kind: str, latency: float):
+        self.latencies.append(latency)
+        self.by_kind[kind].append(latency)
+
+    def error(self, reason: str):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+async def send_one(client, payload: Payload, recorder: Recorder, deadline_seconds: Optional[float],
+                   priority: str = 'interactive'):
+    form = {'priority': priority}
+    if deadline_seconds:
+        form['deadline_seconds'] = str(deadline_seconds)
+
+    recorder.sent += 1
+    start = time.perf_counter()
+    try:
+        if payload.kind == 'pdf':
+            files = {'policy_pdf': (payload.name, payload.data, 'application/pdf')}
+            resp = await client.post('/api/analyze', data=form, files=files)
+        else:
+            resp = await client.post('/api/analyze', data={**form, 'policy_text': payload.data})
+        latency = time.perf_counter() - start
+    except Exception as e:
+        recorder.error(type(e).__name__)
+        return
+
+    if resp.status_code != 200:
+        recorder.error(f"HTTP {resp.status_code}")
+    elif resp.json().get('status') != 'success':
+        recorder.error('status=failed')
+    else:
+        recorder.ok(payload.kind, latency)
+
+def pick_priority(batch_fraction: float, rng: random.Random) -> str:
+    return 'batch' if rng.random() < batch_fraction else 'interactive'
+
+def pick_payload(payloads: Dict[str, List[Payload]], pdf_fraction: float, rng: random.Random) -> Payload:
+    kind = 'pdf' if (rng.random() < pdf_fraction or not payloads['text']) else 'text'
+    return rng.choice(payloads[kind])
+
+async def drive(client, args, payloads, recorder: Recorder):
+    rng = random.Random(args.seed)
+
+    async def next_payload() -> Payload:
+        payload = pick_payload(payloads, args.pdf_fraction, rng)
+        if args.unique_payloads:
+            # Off the loop - building a PDF shouldn't show up as app loop lag
+            payload = await asyncio.to_thread(unique_payload, payload, uuid.uuid4().hex[:12])
+        return payload
+    stop_at = time.perf_counter() + args.duration if args.duration else None
+
+    def more() -> bool:
+        if args.requests and recorder.sent >= args.requests:
+            return False
+        return stop_at is None or time.perf_counter() < stop_at
+
+    if args.rate:
+        # Open loop: fixed arrival rate regardless of how fast responses come back
+        in_flight = set()
+        next_at = time.perf_counter()
+        while more():
+            task = asyncio.ensure_future(
+                send_one(client, await next_payload(), recorder, args.deadline,
+                         pick_priority(args.batch_fraction, rng))
+            )
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            next_at += 1.0 / args.rate
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        if in_flight:
+            await asyncio.wait(in_flight)
+    else:
+        # Closed loop: N users, each sends its next request when the previous returns
+        async def user():
+            while more():
+                await send_one(client, await next_payload(), recorder, args.deadline,
+                               pick_priority(args.batch_fraction, rng))
+        await asyncio.gather(*(user() for _ in range(args.concurrency)))
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+async def run(args) -> Dict:
+    import httpx
+
+    install_fake_llm(args.llm_latency, args.llm_jitter, args.llm_failure_rate, args.llm_fail_extraction)
+    firestore_client = install_fake_firestore()
+    os.environ.setdefault('GOOGLE_API_KEY', 'loadtest-fake-key')
+    # Local deterministic embeddings in a throwaway cache - no embedding API traffic
+    os.environ.setdefault('CLARITY_EMBEDDING_PROVIDER', 'hashing')
+    os.environ.setdefault('CLARITY_EMBEDDINGS_DIR', tempfile.mkdtemp(prefix='clarity-loadtest-emb-'))
+    import main as clarity_main
+
+    payloads = load_payloads(args.inputs_dir)
+    recorder = Recorder()
+    monitor = LoopLagMonitor()
+    server = None
+
+    if args.mode == 'inprocess':
+        # App and client share this loop - lag measures what the app blocks
+        monitor.start()
+        transport = httpx.ASGITransport(app=clarity_main.app)
+        client = httpx.AsyncClient(transport=transport, base_url='http://loadtest', timeout=args.timeout)
+    else:
+        import uvicorn
+
+        port = args.port or _free_port()
+        clarity_main.app.router.on_startup.append(monitor.start)
+        server = uvicorn.Server(uvicorn.Config(clarity_main.app, host='127.0.0.1', port=port, log_level='warning'))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            await asyncio.sleep(0.05)
+        client = httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=args.timeout)
+
+    start = time.perf_counter()
+    try:
+        await drive(client, args, payloads, recorder)
+        admission = (await client.get('/api/metrics')).json()
+    finally:
+        elapsed = time.perf_counter() - start
+        await client.aclose()
+        monitor.stop()
+        if server:
+            server.should_exit = True
+
+    from agents.orchestrator import _analysis_flight
+    from agents.conflict_agent import _verdict_flight
+    analyses = _analysis_flight.stats()
+
+    completed = len(recorder.latencies)
+    failed = sum(recorder.errors.values())
+    lag = monitor.samples
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        'mode': args.mode,
+        'load': f"rate={args.rate}/s" if args.rate else f"concurrency={args.concurrency}",
+        'pdf_fraction': args.pdf_fraction,
+        'unique_payloads': args.unique_payloads,
+        'duration_s': round(elapsed, 2),
+        'requests': completed + failed,
+        'throughput_rps': round(completed / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': ms(percentile(recorder.latencies, 50)),
+            'p95': ms(percentile(recorder.latencies, 95)),
+            'p99': ms(percentile(recorder.latencies, 99)),
+            'max': ms(max(recorder.latencies, default=None))
+        },
+        'latency_p50_ms_by_kind': {k: ms(percentile(v, 50)) for k, v in recorder.by_kind.items()},
+        'error_rate': round(failed / (completed + failed), 4) if (completed + failed) else 0.0,
+        'errors': recorder.errors,
+        'event_loop_lag_ms': {
+            'p50': ms(percentile(lag, 50)),
+            'p99': ms(percentile(lag, 99)),
+            'max': ms(max(lag, default=None))
+        },
+        'admission': admission,
+        'coalescing': {
+            # joined before admission (main.py) + joined inside run_clarity
+            'requests_coalesced': admission.get('coalesced_requests', 0) + analyses['coalesced'],
+            'analyses_computed': analyses['leaders'],
+            'verdicts_computed': _verdict_flight.leaders,
+            'verdicts_shared': _verdict_flight.coalesced
+        },
+        'llm_calls': llm_calls_made(),
+        'firestore': firestore_client.stats()
+    }
+
+def print_report(report: Dict):
+    lat = report['latency_ms']
+    lag = report['event_loop_lag_ms']
+    print(f"\n📊 LOAD TEST - {report['mode']} | {report['load']} | pdf fraction {report['pdf_fraction']}")
+    print(f"   Requests:    {report['requests']} in {report['duration_s']}s → {report['throughput_rps']} req/s")
+    print(f"   Latency ms:  p50 {lat['p50']} | p95 {lat['p95']} | p99 {lat['p99']} | max {lat['max']}")
+    print(f"   By kind p50: {report['latency_p50_ms_by_kind']}")
+    print(f"   Error rate:  {report['error_rate']:.2%} {report['errors'] or ''}")
+    print(f"   Loop lag ms: p50 {lag['p50']} | p99 {lag['p99']} | max {lag['max']}")
+    print(f"   LLM calls:   {report['llm_calls']} | Firestore: {report['firestore']}")
+    co = report['coalescing']
+    print(f"   Computed:    {co['analyses_computed']} analyses | {co['requests_coalesced']} requests coalesced | "
+          f"verdicts {co['verdicts_computed']} computed / {co['verdicts_shared']} shared"
+          + ("" if report['unique_payloads'] else " (identical inputs - try --unique-payloads)"))
+    adm = report['admission']
+    print(f"   Admission:   admitted {adm['admitted']} | rejected {adm['rejected']} | "
+          f"max queue depth {adm['max_queue_depth_seen']} | wait s {adm['wait_seconds']}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CLARITY /api/analyze load test (fake Gemini + in-memory Firestore)")
+    parser.add_argument('--mode', choices=['inprocess', 'uvicorn'], default='inprocess')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--rate', type=float, help="Open loop: requests per second")
+    load.add_argument('--concurrency', type=int, default=4, help="Closed loop: concurrent users")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to generate load (0 = until --requests)")
+    parser.add_argument('--requests', type=int, default=0, help="Stop after this many requests (0 = no cap)")
+    parser.add_argument('--pdf-fraction', type=float, default=0.5, help="Share of requests sent as PDF uploads")
+    parser.add_argument('--inputs-dir', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'inputs'))
+    parser.add_argument('--batch-fraction', type=float, default=0.0, help="Share of requests sent with priority=batch")
+    parser.add_argument('--unique-payloads', action='store_true',
+                        help="Tag every request with a nonce so nothing is coalesced or shared")
+    parser.add_argument('--deadline', type=float, help="deadline_seconds form field sent with each request")
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="Fake LLM latency per call (s)")
+    parser.add_argument('--llm-jitter', type=float, default=0.1, help="± uniform jitter on fake LLM latency (s)")
+    parser.add_argument('--llm-failure-rate', type=float, default=0.0)
+    parser.add_argument('--llm-fail-extraction', action='store_true', help="Force the regex clause fallback")
+    parser.add_argument('--timeout', type=float, default=300.0, help="Client timeout per request (s)")
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    parser.add_argument('--quiet-app', action='store_true', help="Silence the pipeline's print() output")
+    args = parser.parse_args(argv)
+    if not args.duration and not args.requests:
+        parser.error("set --duration or --requests")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.quiet_app:
+        sys.stdout = open(os.devnull, 'w')
+    report = asyncio.run(run(args))
+    sys.stdout = sys.__stdout__
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 import os
 import io
+import asyncio
+import hashlib
 import time
 import traceback
 from dotenv import load_dotenv
 from fastapi import FastAPI, File, UploadFile, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Tuple
 import PyPDF2
 
 # Firebase Admin Init
@@ -13,6 +17,7 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 
 from agents.orchestrator import run_clarity
+from admission import AdmissionController, QueueFull, Ticket, PRIORITIES
 
 # ---- Load ENV ----
 load_dotenv()
@@ -26,6 +31,13 @@ if not firebase_admin._apps:
 
 db = firestore.client()
 
+# ---- Admission control (bounded in-flight pipelines + priority queue) ----
+admission = AdmissionController(
+    max_in_flight=int(os.getenv("CLARITY_MAX_INFLIGHT", "4")),
+    max_queue=int(os.getenv("CLARITY_MAX_QUEUE", "16")),
+    max_batch_queue=int(os.getenv("CLARITY_MAX_BATCH_QUEUE", "8"))
+)
+
 app = FastAPI(title="CLARITY Backend")
 
 # ---- CORS ----
@@ -37,10 +49,8 @@ app.add_middleware(
 )
 
 # ---- PDF text extractor ----
-def extract_pdf_text(pdf_file: UploadFile) -> str:
+def extract_pdf_text(pdf_bytes: bytes) -> str:
     try:
-        pdf_bytes = pdf_file.file.read()
-        pdf_file.file.seek(0)
         reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
         text = ""
         for page in reader.pages:
@@ -53,21 +63,65 @@ def extract_pdf_text(pdf_file: UploadFile) -> str:
     except:
         return ""
 
+# ---- REQUEST COALESCING (ahead of admission) ----
+# input digest + requested deadline → (leader task, its admission ticket)
+_pending: Dict[str, Tuple[asyncio.Task, Ticket]] = {}
+_coalesced = {"requests": 0}
+
+def _finish_pending(key: str, task: asyncio.Task):
+    if _pending.get(key, (None,))[0] is task:
+        del _pending[key]
+    if not task.cancelled():
+        task.exception()  # retrieved - every caller may have disconnected
+
+async def _admitted_analysis(pdf_bytes, policy_text, deadline_seconds, ticket: Ticket) -> Dict:
+    async with admission.admit(ticket=ticket) as queued_seconds:
+        # Read input - blocking work runs off the event loop
+        if pdf_bytes is not None:
+            text = await run_in_threadpool(extract_pdf_text, pdf_bytes)
+        else:
+            text = policy_text
+        # Time spent queued comes out of the caller's budget (not the coalescing key)
+        return await run_in_threadpool(
+            run_clarity, text, deadline_seconds=deadline_seconds, queued_seconds=queued_seconds
+        )
+
 # ---- MAIN ANALYSIS ENDPOINT ----
 @app.post("/api/analyze")
-async def analyze_policy(policy_text: str = Form(None), policy_pdf: UploadFile = File(None)):
+async def analyze_policy(
+    policy_text: str = Form(None),
+    policy_pdf: UploadFile = File(None),
+    deadline_seconds: float = Form(None),
+    priority: str = Form("interactive")
+):
+    if priority not in PRIORITIES:
+        return JSONResponse({"status": "failed", "error": f"priority must be one of {list(PRIORITIES)}"}, status_code=400)
+    if not (policy_pdf and policy_pdf.filename) and not policy_text:
+        return {"status": "failed", "error": "No input"}
+
     try:
-        # Read input
-        if policy_pdf and policy_pdf.filename:
-            text = extract_pdf_text(policy_pdf)
-            result = run_clarity(text)
-        elif policy_text:
-            result = run_clarity(policy_text)
+        pdf_bytes = await policy_pdf.read() if policy_pdf and policy_pdf.filename else None
+        raw = pdf_bytes if pdf_bytes is not None else policy_text.encode("utf-8", "ignore")
+        key = f"{hashlib.sha256(raw).hexdigest()}:{deadline_seconds or ''}"
+
+        # Duplicates join the leader's task BEFORE admission - only the leader takes a slot
+        entry = _pending.get(key)
+        if entry is None or entry[0].done():
+            ticket = Ticket(priority)
+            task = asyncio.create_task(_admitted_analysis(pdf_bytes, policy_text, deadline_seconds, ticket))
+            _pending[key] = (task, ticket)
+            task.add_done_callback(lambda t: _finish_pending(key, t))
         else:
-            return {"status": "failed", "error": "No input"}
+            task, ticket = entry
+            # An interactive caller never waits in the batch class behind a batch leader
+            admission.promote(ticket, priority)
+            _coalesced["requests"] += 1
+            print("🔁 Joined an identical in-flight request")
+        # shield: a client going away doesn't cancel work other callers are waiting on
+        result = await asyncio.shield(task)
 
         # Store in Firestore
-        fb = db.collection("clarity_outputs").add({
+        fb = await run_in_threadpool(db.collection("clarity_outputs").add, {
             "result": result,
             "createdAt": firestore.SERVER_TIMESTAMP
         })
@@ -76,10 +130,21 @@ async def analyze_policy(policy_text: str = Form(None), policy_pdf: UploadFile =
 
         return {"status": "success", "firebase_id": fb[1].id, "data": result}
 
+    except QueueFull as e:
+        return JSONResponse(
+            {"status": "failed", "error": "Server busy - retry later", "retry_after_seconds": e.retry_after},
+            status_code=429,
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         traceback.print_exc()
         return {"status": "failed", "error": str(e)}
 
+# ---- ADMISSION / QUEUE METRICS ----
+@app.get("/api/metrics")
+async def get_metrics():
+    return {**admission.metrics(), "coalesced_requests": _coalesced["requests"], "pending_analyses": len(_pending)}
+
 # ---- NEW ENDPOINT TO READ FIRESTORE JSON ----
 @app.get("/api/history")
 async def get_history():
@@ -0,0 +1,285 @@
+const { spawn } = require("child_process");
+const readline = require("readline");
+const path = require("path");
+
+// 🐍 Persistent Python worker pool - line-delimited JSON over stdin/stdout (see worker.py)
+
+function timeoutError(job) {
+  const err = new Error(`Analysis timed out after ${job.timeoutMs} ms`);
+  err.code = "ETIMEDOUT";
+  return err;
+}
+
+function unavailableError() {
+  const err = new Error("No Python worker available - workers keep crashing on start");
+  err.code = "EUNAVAILABLE";
+  return err;
+}
+
+class PythonWorker {
+  constructor(pool, index) {
+    this.pool = pool;
+    this.index = index;
+    this.proc = null;
+    this.ready = false;
+    this.job = null;          // in-flight analyze job
+    this.ping = null;         // in-flight health check
+    this.nextId = 1;
+    this.crashes = 0;
+    this.killReason = null;   // set when we kill the process, so onExit can say why
+  }
+
+  start() {
+    const { pythonBin, script, cwd } = this.pool.options;
+    this.ready = false;
+    this.killReason = null;
+    this.proc = spawn(pythonBin, ["-u", script], {
+      cwd,
+      stdio: ["pipe", "pipe", "inherit"]
+    });
+
+    const lines = readline.createInterface({ input: this.proc.stdout });
+    lines.on("line", (line) => this.onLine(line));
+
+    // 'exit' isn't guaranteed after a spawn failure - make sure cleanup runs exactly once
+    const proc = this.proc;
+    let gone = false;
+    const onGone = (code, signal) => {
+      if (gone) return;
+      gone = true;
+      this.onExit(code, signal);
+    };
+
+    // EPIPE after a crash is handled by the exit path below
+    proc.stdin.on("error", () => {});
+    proc.on("error", (err) => {
+      console.error(`❌ Worker ${this.index} process error: ${err.message}`);
+      if (!proc.pid) onGone(null, null);
+    });
+    proc.on("exit", onGone);
+  }
+
+  send(message) {
+    this.proc.stdin.write(JSON.stringify(message) + "\n");
+  }
+
+  onLine(line) {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (e) {
+      console.error(`⚠️ Worker ${this.index} sent non-JSON line: ${line.slice(0, 200)}`);
+      return;
+    }
+
+    if (message.ready) {
+      this.ready = true;
+      this.crashes = 0;
+      console.log(`🐍 Worker ${this.index} ready (pid ${message.pid})`);
+      this.pool.dispatch();
+      return;
+    }
+
+    if (this.ping && message.id === this.ping.id) {
+      clearTimeout(this.ping.timer);
+      this.ping = null;
+      this.pool.dispatch();
+      return;
+    }
+
+    if (this.job && message.id === this.job.id) {
+      const job = this.job;
+      this.job = null;
+      clearTimeout(job.timer);
+      if (message.ok) {
+        job.resolve(message.result);
+      } else {
+        job.reject(new Error(message.error || "Python worker error"));
+      }
+      this.pool.dispatch();
+    }
+  }
+
+  onExit(code, signal) {
+    console.error(`💥 Worker ${this.index} exited (code ${code}, signal ${signal})`);
+    this.ready = false;
+    this.proc = null;
+
+    if (this.ping) {
+      clearTimeout(this.ping.timer);
+      this.ping = null;
+    }
+    if (this.job) {
+      const job = this.job;
+      this.job = null;
+      clearTimeout(job.timer);
+      job.reject(this.jobFailure(job));
+    }
+
+    if (this.pool.closed) return;
+
+    // Back off on crash loops so a broken environment doesn't spin the CPU
+    this.crashes += 1;
+    this.pool.failQueuedIfUnavailable();
+    const delay = Math.min(this.pool.options.restartDelayMs * 2 ** (this.crashes - 1), 30000);
+    this.pool.restarts += 1;
+    setTimeout(() => {
+      if (!this.pool.closed) this.start();
+    }, delay);
+  }
+
+  kill(reason) {
+    if (!this.proc) return;
+    console.error(`🔪 Killing worker ${this.index}: ${reason}`);
+    this.killReason = reason;
+    this.proc.kill("SIGKILL");
+  }
+
+  jobFailure(job) {
+    if (job.timedOut) return timeoutError(job);
+    if (this.killReason) {
+      return new Error(`Python worker killed while processing the request (${this.killReason})`);
+    }
+    return new Error("Python worker crashed while processing the request");
+  }
+
+  run(job) {
+    // job.timer was armed at enqueue time - the timeout covers queueing too
+    job.id = this.nextId++;
+    job.worker = this;
+    this.job = job;
+    this.send({
+      id: job.id,
+      method: "analyze",
+      policyText: job.policyText,
+      deadlineSeconds: job.deadlineSeconds
+    });
+  }
+
+  healthCheck() {
+    if (!this.ready || this.job || this.ping) return;
+    const id = this.nextId++;
+    this.ping = {
+      id,
+      timer: setTimeout(() => this.kill("health check timeout"), this.pool.options.healthTimeoutMs)
+    };
+    this.send({ id, method: "ping" });
+  }
+
+  get idle() {
+    return this.ready && !this.job && !this.ping;
+  }
+}
+
+class PythonWorkerPool {
+  constructor(options = {}) {
+    this.options = {
+      size: 2,
+      pythonBin: "python",
+      script: path.join(__dirname, "worker.py"),
+      cwd: __dirname,
+      requestTimeoutMs: 120000,
+      healthIntervalMs: 15000,
+      healthTimeoutMs: 5000,
+      restartDelayMs: 500,
+      maxQueue: 32,
+      retryAfterSeconds: 5,
+      ...options
+    };
+    this.workers = [];
+    this.queue = [];
+    this.closed = false;
+    this.restarts = 0;
+    this.healthTimer = null;
+  }
+
+  start() {
+    for (let i = 0; i < this.options.size; i++) {
+      const worker = new PythonWorker(this, i);
+      this.workers.push(worker);
+      worker.start();
+    }
+    this.healthTimer = setInterval(
+      () => this.workers.forEach((w) => w.healthCheck()),
+      this.options.healthIntervalMs
+    );
+    this.healthTimer.unref();
+    return this;
+  }
+
+  analyze(policyText, deadlineSeconds) {
+    if (this.closed) return Promise.reject(new Error("Worker pool is closed"));
+    if (this.unavailable) return Promise.reject(unavailableError());
+    if (this.queue.length >= this.options.maxQueue) {
+      const err = new Error(`Analysis queue full (${this.options.maxQueue} waiting)`);
+      err.code = "EQUEUEFULL";
+      err.retryAfterSeconds = this.options.retryAfterSeconds;
+      return Promise.reject(err);
+    }
+
+    // Worker-side deadline + grace, so a partial result still makes it back
+    const timeoutMs = deadlineSeconds
+      ? Math.min(deadlineSeconds * 1000 + 5000, this.options.requestTimeoutMs)
+      : this.options.requestTimeoutMs;
+
+    return new Promise((resolve, reject) => {
+      const job = { policyText, deadlineSeconds, timeoutMs, resolve, reject, worker: null };
+      job.timer = setTimeout(() => this.expire(job), timeoutMs);
+      this.queue.push(job);
+      this.dispatch();
+    });
+  }
+
+  expire(job) {
+    job.timedOut = true;
+    if (job.worker) {
+      job.worker.kill("request timeout");  // onExit rejects with the timeout error
+      return;
+    }
+    const index = this.queue.indexOf(job);
+    if (index !== -1) this.queue.splice(index, 1);
+    job.reject(timeoutError(job));
+  }
+
+  // Every worker is crash-looping (never came up twice in a row) - waiting won't help
+  get unavailable() {
+    return this.workers.length > 0 && this.workers.every((w) => !w.ready && w.crashes >= 2);
+  }
+
+  failQueuedIfUnavailable() {
+    if (!this.unavailable) return;
+    this.queue.splice(0).forEach((job) => {
+      clearTimeout(job.timer);
+      job.reject(unavailableError());
+    });
+  }
+
+  dispatch() {
+    for (const worker of this.workers) {
+      if (!this.queue.length) return;
+      if (worker.idle) worker.run(this.queue.shift());
+    }
+  }
+
+  stats() {
+    return {
+      size: this.workers.length,
+      ready: this.workers.filter((w) => w.ready).length,
+      busy: this.workers.filter((w) => w.job).length,
+      queued: this.queue.length,
+      restarts: this.restarts
+    };
+  }
+
+  close() {
+    this.closed = true;
+    clearInterval(this.healthTimer);
+    this.queue.splice(0).forEach((job) => {
+      clearTimeout(job.timer);
+      job.reject(new Error("Worker pool is closed"));
+    });
+    this.workers.forEach((w) => w.proc && w.proc.kill());
+  }
+}
+
+module.exports = { PythonWorkerPool };
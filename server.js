@@ -1,12 +1,12 @@
 const express = require("express");
 const cors = require("cors");
-const { exec } = require("child_process");
 const admin = require("firebase-admin");
 const fs = require("fs");
+const { PythonWorkerPool } = require("./pythonPool");
 
 const app = express();
 app.use(cors());
-app.use(express.json());
+app.use(express.json({ limit: "20mb" }));
 
 // 🔐 Firebase Admin Init
 const serviceAccount = JSON.parse(
@@ -19,42 +19,66 @@ admin.initializeApp({
 
 const db = admin.firestore();
 
+// 🐍 Python workers - started once, reused for every request
+const pool = new PythonWorkerPool({
+  size: parseInt(process.env.CLARITY_WORKERS || "2", 10),
+  pythonBin: process.env.CLARITY_PYTHON || "python",
+  requestTimeoutMs: parseInt(process.env.CLARITY_REQUEST_TIMEOUT_MS || "120000", 10),
+  maxQueue: parseInt(process.env.CLARITY_MAX_QUEUE || "32", 10)
+}).start();
+
 // 🚀 API
-app.post("/analyze", (req, res) => {
-  const { policyText } = req.body;
-
-  exec(
-    `python -c "from orchestrator import run_clarity; import json; print(json.dumps(run_clarity('''${policyText.replace(/'/g, "\\'")}''')))"`,
-    async (err, stdout) => {
-      if (err) {
-        return res.status(500).json({ error: err.message });
-      }
-
-      try {
-        const result = JSON.parse(stdout);
-
-        // 🔥 Store in Firebase
-        const docRef = await db.collection("clarity_outputs").add({
-          policyText,
-          result,
-          critical: result.summary.critical,
-          warnings: result.summary.warnings,
-          createdAt: new Date()
-        });
-
-        res.json({
-          firebase_id: docRef.id,
-          result
-        });
-
-      } catch (e) {
-        res.status(500).json({
-          error: "Invalid JSON from Python",
-          raw: stdout
-        });
-      }
+app.post("/analyze", async (req, res) => {
+  const { policyText, deadlineSeconds } = req.body;
+
+  if (typeof policyText !== "string" || !policyText.trim()) {
+    return res.status(400).json({ error: "policyText is required" });
+  }
+  if (
+    deadlineSeconds !== undefined && deadlineSeconds !== null &&
+    (typeof deadlineSeconds !== "number" || !Number.isFinite(deadlineSeconds) || deadlineSeconds <= 0)
+  ) {
+    return res.status(400).json({ error: "deadlineSeconds must be a positive number" });
+  }
+
+  let result;
+  try {
+    result = await pool.analyze(policyText, deadlineSeconds);
+  } catch (e) {
+    if (e.code === "EQUEUEFULL") {
+      res.set("Retry-After", String(e.retryAfterSeconds));
+      return res.status(429).json({ error: e.message, retry_after_seconds: e.retryAfterSeconds });
     }
-  );
+    const status = { ETIMEDOUT: 504, EUNAVAILABLE: 503 }[e.code] || 500;
+    return res.status(status).json({ error: e.message });
+  }
+
+  try {
+    // 🔥 Store in Firebase
+    const docRef = await db.collection("clarity_outputs").add({
+      policyText,
+      result,
+      critical: result.summary.critical,
+      warnings: result.summary.warnings,
+      createdAt: new Date()
+    });
+
+    res.json({
+      firebase_id: docRef.id,
+      result
+    });
+
+  } catch (e) {
+    res.status(500).json({
+      error: "Firestore write failed: " + e.message,
+      result
+    });
+  }
+});
+
+app.get("/health", (req, res) => {
+  const stats = pool.stats();
+  res.status(stats.ready > 0 ? 200 : 503).json(stats);
 });
 
 app.listen(5000, () => {
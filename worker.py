@@ -0,0 +1,73 @@
+"""Long-lived CLARITY worker for server.js - line-delimited JSON over stdin/stdout
+
+One JSON object per line in each direction:
+  → {"id": 1, "method": "analyze", "policyText": "...", "deadlineSeconds": 20}
+  → {"id": 2, "method": "ping"}
+  ← {"id": 1, "ok": true, "result": {...}}
+  ← {"id": 2, "ok": false, "error": "..."}
+
+A {"id": null, "ok": true, "ready": true} line is sent once the agents are imported.
+"""
+import json
+import os
+import sys
+import time
+import traceback
+
+def _open_protocol_stream():
+    """Keep the real stdout for protocol lines - agent print() chatter goes to stderr"""
+    protocol_fd = os.dup(sys.stdout.fileno())
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    return os.fdopen(protocol_fd, "w", encoding="utf-8", buffering=1)
+
+def _send(stream, message: dict):
+    stream.write(json.dumps(message, ensure_ascii=False) + "\n")
+    stream.flush()
+
+def main():
+    protocol = _open_protocol_stream()
+    started = time.time()
+
+    # Heavy imports (Gemini SDK, corpus) paid once per worker, not per request
+    from agents.orchestrator import run_clarity
+
+    _send(protocol, {"id": None, "ok": True, "ready": True, "pid": os.getpid()})
+    handled = 0
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            _send(protocol, {"id": None, "ok": False, "error": f"Bad request line: {e}"})
+            continue
+
+        request_id = request.get("id")
+        method = request.get("method")
+
+        if method == "ping":
+            _send(protocol, {
+                "id": request_id,
+                "ok": True,
+                "result": {"pid": os.getpid(), "handled": handled, "uptime_seconds": round(time.time() - started, 1)}
+            })
+        elif method == "analyze":
+            try:
+                result = run_clarity(
+                    request.get("policyText") or "",
+                    deadline_seconds=request.get("deadlineSeconds")
+                )
+                _send(protocol, {"id": request_id, "ok": True, "result": result})
+            except Exception as e:
+                traceback.print_exc()
+                _send(protocol, {"id": request_id, "ok": False, "error": str(e)})
+            handled += 1
+        else:
+            _send(protocol, {"id": request_id, "ok": False, "error": f"Unknown method: {method}"})
+
+if __name__ == "__main__":
+    main()